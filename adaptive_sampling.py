@@ -0,0 +1,98 @@
+import logging
+import math
+from contextlib import contextmanager
+
+# Candidatos gerados por passada do autorregressivo no modo adaptativo (lotes pequenos para
+# poder parar cedo)
+ADAPTIVE_BATCH_SIZE = 4
+
+# Nunca para antes de ter pelo menos estes candidatos
+MIN_CANDIDATES = 8
+
+# Partes com pelo menos este tamanho recebem o orçamento inteiro do preset; as menores,
+# um orçamento proporcional ao número de caracteres
+FULL_BUDGET_CHARS = 200
+
+# Lotes seguidos sem melhora relevante do melhor escore CLVP antes de parar
+PATIENCE = 2
+MIN_IMPROVEMENT = 0.1
+
+
+# Amostragem adaptativa de candidatos: os candidatos são gerados em lotes pequenos, cada lote
+# é pontuado pelo CLVP e a geração para quando o melhor escore passa do limiar (se houver) ou
+# para de melhorar. O orçamento de candidatos cresce com o tamanho da parte.
+class AdaptiveSampling:
+    def __init__(self, score_threshold=None, patience=PATIENCE, min_improvement=MIN_IMPROVEMENT,
+                 min_candidates=MIN_CANDIDATES, batch_size=ADAPTIVE_BATCH_SIZE, full_budget_chars=FULL_BUDGET_CHARS):
+        self.score_threshold = score_threshold
+        self.patience = patience
+        self.min_improvement = min_improvement
+        self.min_candidates = min_candidates
+        self.batch_size = batch_size
+        self.full_budget_chars = full_budget_chars
+        self.history = []
+
+    # Identifica os parâmetros na chave do cache de resultados (o áudio depende deles)
+    @property
+    def variant(self):
+        return (f'adaptive:{self.score_threshold}:{self.patience}:{self.min_improvement}:'
+                f'{self.min_candidates}:{self.full_budget_chars}')
+
+    # Orçamento de candidatos para uma parte: proporcional ao tamanho, até o número do preset,
+    # arredondado para um múltiplo do lote
+    def budget(self, text, preset_samples, batch_size):
+        scaled = preset_samples * min(1.0, len(text) / self.full_budget_chars)
+        budget = max(self.min_candidates, math.ceil(scaled))
+        budget = math.ceil(budget / batch_size) * batch_size
+        return min(budget, max(batch_size, preset_samples // batch_size * batch_size))
+
+    # Durante o bloco, o inference_speech do autorregressivo pontua cada lote com o CLVP e, depois
+    # da parada, devolve cópias do pior candidato já gerado em vez de gerar novos: o tts() do
+    # Tortoise completa as passadas que planejou, mas o ranqueamento final continua escolhendo
+    # entre os candidatos reais. Devolve o registro da parte (candidatos usados, motivo, escore).
+    @contextmanager
+    def sampling(self, tts, budget, k=1, chunk=None):
+        import torch
+        from tortoise.api import fix_autoregressive_output
+
+        autoregressive = tts.autoregressive
+        original = autoregressive.inference_speech
+        stop_token = autoregressive.stop_mel_token
+        record = {'chunk': chunk, 'budget': budget, 'candidates': 0, 'reason': 'budget', 'best_score': None}
+        state = {'stopped': False, 'worst': None, 'worst_score': None, 'stale': 0}
+
+        def inference_speech(conditioning, text_tokens, *args, **kwargs):
+            if state['stopped']:
+                return state['worst'].repeat(kwargs.get('num_return_sequences', 1), 1)
+            codes = original(conditioning, text_tokens, *args, **kwargs)
+            with torch.no_grad():
+                fixed = torch.stack([fix_autoregressive_output(c.clone(), stop_token, complain=False) for c in codes])
+                scores = tts.clvp(text_tokens.repeat(codes.shape[0], 1), fixed, return_loss=False)
+            record['candidates'] += codes.shape[0]
+
+            best = scores.max().item()
+            if record['best_score'] is None or best > record['best_score'] + self.min_improvement:
+                state['stale'] = 0
+            else:
+                state['stale'] += 1
+            record['best_score'] = best if record['best_score'] is None else max(record['best_score'], best)
+            worst = scores.argmin()
+            if state['worst_score'] is None or scores[worst].item() < state['worst_score']:
+                state['worst'], state['worst_score'] = codes[worst:worst + 1].clone(), scores[worst].item()
+
+            if record['candidates'] >= max(k, self.min_candidates):
+                if self.score_threshold is not None and record['best_score'] >= self.score_threshold:
+                    state['stopped'], record['reason'] = True, 'threshold'
+                elif state['stale'] >= self.patience:
+                    state['stopped'], record['reason'] = True, 'plateau'
+            return codes
+
+        autoregressive.inference_speech = inference_speech
+        try:
+            yield record
+        finally:
+            autoregressive.inference_speech = original
+            self.history.append(record)
+            if record['best_score'] is not None:
+                logging.info(f"Parte {chunk}: {record['candidates']} de {budget} candidatos "
+                             f"({record['reason']}), melhor escore CLVP {record['best_score']:.2f}.")
@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from aiohttp import web
+
+from audio_sink import SAMPLE_RATE, read_wav_pcm, streaming_wav_header
+from jobs import (JOBS_DB_PATH, STATUS_DONE, STATUS_FAILED, cancel_job, count_queued, get_job,
+                  list_workers, submit_job)
+from scheduler import submit_scheduled_job
+from voice_registry import VoiceRegistry
+
+# Pasta de vozes padrão (a mesma da ingestão em lote)
+DEFAULT_VOICES_DIR = os.path.join('voices_cloning_app', 'voices')
+
+# Trabalhos enviados pela API e ainda não concluídos; acima disso, novos pedidos esperam uma vaga
+DEFAULT_MAX_IN_FLIGHT = 8
+
+# Tamanho máximo da fila inteira (de todos os clientes) antes de recusar pedidos com 429
+DEFAULT_MAX_QUEUED = 64
+
+# Quanto um pedido espera por uma vaga antes de ser recusado
+ADMISSION_TIMEOUT = 5
+
+# Prazo padrão de um pedido, do envio ao fim do áudio (pode ser mudado por pedido)
+DEFAULT_TIMEOUT = 600
+
+# Presets do Tortoise aceitos (os mesmos de longform, sem importar o torch neste processo)
+VALID_PRESETS = ('ultra_fast', 'fast', 'standard', 'high_quality')
+
+# Intervalo entre consultas ao estado do trabalho enquanto o áudio é transmitido
+STREAM_POLL_INTERVAL = 0.25
+
+
+def _job_view(job):
+    return {
+        'id': job['id'],
+        'status': job['status'],
+        'voice': job['voice_name'],
+        'preset': job['preset'],
+        'seed': job['seed'],
+        'parts_done': job['parts_done'],
+        'parts_total': job['parts_total'],
+        'error': job['error'],
+        'stats': job['stats'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+    }
+
+
+def _error(status, message):
+    return web.json_response({'error': message}, status=status)
+
+
+# Campo numérico opcional do pedido; valores que não são números viram 400
+def _number(body, name, default=None, cast=float, positive=False):
+    value = body.get(name, default)
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise web.HTTPBadRequest(reason=f"'{name}' deve ser um número.")
+    try:
+        number = cast(value)
+    except (TypeError, ValueError, OverflowError):
+        raise web.HTTPBadRequest(reason=f"'{name}' deve ser um número.")
+    if cast is float and number != number:
+        raise web.HTTPBadRequest(reason=f"'{name}' deve ser um número.")
+    if positive and number <= 0:
+        raise web.HTTPBadRequest(reason=f"'{name}' deve ser positivo.")
+    return number
+
+
+# Serviço HTTP assíncrono sobre a fila de trabalhos: os workers (python jobs.py) geram o áudio,
+# o serviço só enfileira, acompanha e transmite as partes conforme ficam prontas
+class SynthesisService:
+    def __init__(self, voices_dir=DEFAULT_VOICES_DIR, db_path=JOBS_DB_PATH, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 max_queued=DEFAULT_MAX_QUEUED, default_timeout=DEFAULT_TIMEOUT):
+        self.registry = VoiceRegistry(voices_dir)
+        self.db_path = db_path
+        self.max_queued = max_queued
+        self.default_timeout = default_timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._watchers = set()
+
+    def _db(self, fn, *args, **kwargs):
+        # O SQLite bloqueia; as consultas rodam no pool de threads para não travar o laço de eventos
+        return asyncio.to_thread(fn, *args, db_path=self.db_path, **kwargs)
+
+    async def _parse_request(self, request):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(reason="Corpo JSON inválido.")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(reason="O corpo deve ser um objeto JSON.")
+        voice = body.get('voice')
+        text = body.get('text')
+        preset = body.get('preset', 'fast')
+        if not isinstance(text, str) or not text.strip():
+            raise web.HTTPBadRequest(reason="Informe 'text'.")
+        if preset not in VALID_PRESETS:
+            raise web.HTTPBadRequest(reason=f"Preset desconhecido: {preset}")
+        if not isinstance(voice, str) or not voice or os.sep in voice or voice.startswith('.'):
+            raise web.HTTPNotFound(reason=f"Voz não encontrada: {voice}")
+        entry = await asyncio.to_thread(self.registry.get, voice)
+        if entry is None or not entry['clips']:
+            raise web.HTTPNotFound(reason=f"Voz não encontrada: {voice}")
+        timeout = _number(body, 'timeout', self.default_timeout, positive=True)
+        seed = _number(body, 'seed', cast=int)
+        # Com latency_target (segundos), o escalonador escolhe o preset e ignora o informado
+        latency_target = _number(body, 'latency_target', positive=True)
+        return entry, text.strip(), preset, seed, bool(body.get('incremental', False)), timeout, latency_target
+
+    # Reserva uma vaga para um trabalho novo; com a fila cheia ou sem vaga a tempo, recusa (429)
+    async def _admit(self):
+        if await self._db(count_queued) >= self.max_queued:
+            raise web.HTTPTooManyRequests(reason="Fila cheia.", headers={'Retry-After': '10'})
+        try:
+            await asyncio.wait_for(self._slots.acquire(), ADMISSION_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise web.HTTPTooManyRequests(reason="Limite de pedidos simultâneos.", headers={'Retry-After': '5'})
+
+    async def _submit(self, request):
+        entry, text, preset, seed, incremental, timeout, latency_target = await self._parse_request(request)
+        await self._admit()
+        try:
+            if latency_target is not None:
+                job_id = await asyncio.to_thread(submit_scheduled_job, entry['name'], entry['dir'], text,
+                                                 latency_target, seed=seed, db_path=self.db_path,
+                                                 incremental=incremental)
+            else:
+                job_id = await asyncio.to_thread(submit_job, entry['name'], entry['dir'], text, preset=preset,
+                                                 seed=seed, db_path=self.db_path, incremental=incremental)
+        except Exception:
+            self._slots.release()
+            raise
+        deadline = time.monotonic() + timeout
+        watcher = asyncio.create_task(self._watch(job_id, deadline))
+        self._watchers.add(watcher)
+        watcher.add_done_callback(self._watchers.discard)
+        return job_id, deadline
+
+    # Libera a vaga quando o trabalho termina; se o prazo acabar antes, cancela o trabalho (na
+    # fila ele falha na hora; em andamento, o worker para antes da próxima parte)
+    async def _watch(self, job_id, deadline):
+        try:
+            while True:
+                job = await self._db(get_job, job_id)
+                if job is None or job['status'] in (STATUS_DONE, STATUS_FAILED):
+                    return
+                if time.monotonic() > deadline and not job['cancel_requested']:
+                    await self._db(cancel_job, job_id, "Tempo esgotado.")
+                    logging.warning(f"Trabalho {job_id} cancelado: prazo esgotado ({job['status']}).")
+                await asyncio.sleep(1)
+        finally:
+            self._slots.release()
+
+    # POST /jobs: enfileira e responde na hora com os endereços de consulta e de áudio
+    async def create_job(self, request):
+        job_id, _ = await self._submit(request)
+        return web.json_response({
+            'id': job_id,
+            'status_url': f'/jobs/{job_id}',
+            'audio_url': f'/jobs/{job_id}/audio',
+        }, status=202)
+
+    # GET /jobs/{id}
+    async def job_status(self, request):
+        job = await self._db(get_job, request.match_info['job_id'])
+        if job is None:
+            return _error(404, "Trabalho não encontrado.")
+        return web.json_response(_job_view(job))
+
+    # GET /jobs/{id}/audio?format=wav|pcm: transmite as partes (chunked) assim que ficam prontas
+    async def job_audio(self, request):
+        job_id = request.match_info['job_id']
+        if await self._db(get_job, job_id) is None:
+            return _error(404, "Trabalho não encontrado.")
+        timeout = _number(request.query, 'timeout', self.default_timeout, positive=True)
+        # O trabalho pode ser de outro cliente: o prazo do leitor só encerra a leitura, nunca o trabalho
+        return await self._stream(request, job_id, time.monotonic() + timeout, owner=False)
+
+    # POST /synthesize: enfileira e já transmite o áudio na mesma resposta; se o cliente
+    # desistir (desconectar), o trabalho é cancelado
+    async def synthesize(self, request):
+        job_id, deadline = await self._submit(request)
+        try:
+            return await self._stream(request, job_id, deadline, owner=True)
+        except (ConnectionResetError, asyncio.CancelledError):
+            await asyncio.shield(self._db(cancel_job, job_id, "Cliente desconectado."))
+            logging.warning(f"Trabalho {job_id} cancelado: cliente desconectado.")
+            raise
+
+    # Fecha a conexão no meio da resposta (sem o fim do chunked): o cliente vê a transmissão
+    # incompleta em vez de um áudio que parece completo
+    def _abort(self, request, response):
+        request.transport.close()
+        return response
+
+    # Transmite as partes do trabalho. A resposta só começa com a primeira parte pronta, então
+    # uma falha (ou o prazo esgotado) antes disso ainda vira um status de erro; depois que o
+    # áudio começou, uma falha fecha a conexão sem o fim do chunked, e o cliente vê o corte.
+    # Só o dono do trabalho (owner, o /synthesize que o enviou) o cancela quando o prazo acaba.
+    async def _stream(self, request, job_id, deadline, owner):
+        audio_format = request.query.get('format', 'wav')
+        if audio_format not in ('wav', 'pcm'):
+            return _error(400, "Formato deve ser 'wav' ou 'pcm'.")
+
+        response = None
+        sent = 0
+        while True:
+            job = await self._db(get_job, job_id)
+            if response is None and job['status'] == STATUS_FAILED and not job['parts_done']:
+                return _error(500, f"A geração falhou: {job['error']}")
+            if response is None and (job['parts_done'] or job['status'] == STATUS_DONE):
+                response = web.StreamResponse(headers={
+                    'Content-Type': ('audio/wav' if audio_format == 'wav'
+                                     else f'audio/L16; rate={SAMPLE_RATE}; channels=1'),
+                    'X-Job-Id': job_id,
+                })
+                response.enable_chunked_encoding()
+                await response.prepare(request)
+                if audio_format == 'wav':
+                    await response.write(streaming_wav_header(SAMPLE_RATE))
+            # Envia cada parte nova; write() espera o cliente consumir (backpressure), então um
+            # cliente lento nunca acumula mais que uma parte em memória
+            while sent < job['parts_done']:
+                part_path = os.path.join(job['result_dir'], f'{sent}.wav')
+                _, _, pcm = await asyncio.to_thread(read_wav_pcm, part_path)
+                await response.write(pcm)
+                sent += 1
+            if job['status'] == STATUS_DONE:
+                break
+            if job['status'] == STATUS_FAILED:
+                logging.warning(f"Transmissão do trabalho {job_id} interrompida: {job['error']}")
+                return self._abort(request, response)
+            if time.monotonic() > deadline:
+                if owner:
+                    await self._db(cancel_job, job_id, "Tempo esgotado.")
+                logging.warning(f"Transmissão do trabalho {job_id} encerrada por tempo esgotado.")
+                if response is None:
+                    return _error(504, "Tempo esgotado.")
+                return self._abort(request, response)
+            if request.transport is None or request.transport.is_closing():
+                raise ConnectionResetError("Cliente desconectado.")
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+        await response.write_eof()
+        return response
+
+    # GET /health: workers vivos e tamanho da fila
+    async def health(self, request):
+        workers = await self._db(list_workers)
+        return web.json_response({
+            'workers': [{'name': w['name'], 'status': w['status']} for w in workers],
+            'queued': await self._db(count_queued),
+        })
+
+
+def create_app(voices_dir=DEFAULT_VOICES_DIR, db_path=JOBS_DB_PATH, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+               max_queued=DEFAULT_MAX_QUEUED, default_timeout=DEFAULT_TIMEOUT):
+    service = SynthesisService(voices_dir, db_path, max_in_flight, max_queued, default_timeout)
+    app = web.Application()
+    app['service'] = service
+    app.add_routes([
+        web.post('/jobs', service.create_job),
+        web.get('/jobs/{job_id}', service.job_status),
+        web.get('/jobs/{job_id}/audio', service.job_audio),
+        web.post('/synthesize', service.synthesize),
+        web.get('/health', service.health),
+    ])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP assíncrona de síntese (usa os workers de jobs.py).")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--voices-dir', default=DEFAULT_VOICES_DIR, help="Pasta com uma subpasta por voz.")
+    parser.add_argument('--db', default=JOBS_DB_PATH, help="Caminho do banco SQLite da fila.")
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help="Trabalhos da API em andamento ao mesmo tempo.")
+    parser.add_argument('--max-queued', type=int, default=DEFAULT_MAX_QUEUED,
+                        help="Tamanho da fila acima do qual novos pedidos são recusados (429).")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="Prazo padrão de cada pedido (s).")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(create_app(args.voices_dir, args.db, args.max_in_flight, args.max_queued, args.timeout),
+                host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,11 @@
 import streamlit as st
-import torch
-import torchaudio
 import os
-from tortoise.api import TextToSpeech
-from tortoise.utils.audio import load_voice
-from tortoise.utils.text import split_and_recombine_text
 from time import time
 import warnings
 
+from audio_sink import AudioSink
+from lazy_tts import LazyTTS
+
 # Suprimir avisos futuros para uma interface mais limpa
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
@@ -19,12 +17,22 @@ st.write("""
 Esta aplicação permite selecionar uma voz personalizada, inserir um texto e gerar o áudio correspondente.
 """)
 
-# Inicialização do Tortoise TTS com cache para melhorar desempenho
+# Inicialização do Tortoise TTS com cache para melhorar desempenho. O modelo é carregado em
+# segundo plano, então a página aparece imediatamente.
 @st.cache_resource
 def initialize_tts():
-    return TextToSpeech()
+    return LazyTTS().warm_up()
+
+tts_handle = initialize_tts()
 
-tts = initialize_tts()
+# Indicador de prontidão do modelo
+if tts_handle.ready:
+    st.sidebar.success("Modelo pronto.")
+    st.sidebar.caption(f"Tempos do modelo: {tts_handle.status()}")
+elif tts_handle.failed:
+    st.sidebar.error("Falha ao carregar o modelo.")
+else:
+    st.sidebar.info("Carregando o modelo em segundo plano...")
 
 # Função para carregar vozes personalizadas de caminhos fornecidos
 def load_custom_voices():
@@ -110,17 +118,22 @@ if selected_voice:
     if st.button("Gerar Áudio"):
         with st.spinner("Gerando áudio..."):
             try:
+                # Imports pesados só na primeira geração (já feitos pelo aquecimento, se terminou)
+                import torch
+                from tortoise.utils.audio import load_voice
+                from longform import split_text
+                
+                request_start = time()
+                tts = tts_handle.get()
+                
                 # Preparação do Texto
-                if '|' in text_input:
-                    texts = text_input.split('|')
-                else:
-                    texts = split_and_recombine_text(text_input)
+                texts = split_text(text_input)
                 
                 seed = int(time())
                 
-                # Diretório para salvar os resultados
+                # Diretório para salvar os resultados (a gravação em disco é feita em segundo plano)
                 outpath = os.path.join("results", "longform", os.path.basename(selected_voice))
-                os.makedirs(outpath, exist_ok=True)
+                sink = AudioSink(persist_dir=outpath)
                 
                 # Carregar amostras de voz
                 voice_samples, conditioning_latents = load_voice(selected_voice)
@@ -136,20 +149,17 @@ if selected_voice:
                         use_deterministic_seed=seed
                     )
                     gen = gen.squeeze(0).cpu()
-                    part_path = os.path.join(outpath, f'{j}.wav')
-                    torchaudio.save(part_path, gen, 24000)
+                    sink.write(j, gen)
                     all_parts.append(gen)
                 
                 # Concatenar todas as partes em um único áudio
                 full_audio = torch.cat(all_parts, dim=-1)
-                combined_path = os.path.join(outpath, 'combined.wav')
-                torchaudio.save(combined_path, full_audio, 24000)
-
-                with open(combined_path, 'rb') as f:
-                    audio_bytes = f.read()
+                combined_audio = sink.write('combined', full_audio)
                 
-                # Exibir o áudio gerado
-                st.audio(combined_path, format='audio/wav')
+                # Exibir o áudio gerado direto da memória, sem reler o arquivo
+                st.audio(combined_audio.tobytes(), format=sink.mime_type)
+                sink.wait()
+                tts_handle.record_first_request(time() - request_start)
                 st.success("Áudio gerado com sucesso!")
             
             except Exception as e:
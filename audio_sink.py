@@ -0,0 +1,186 @@
+import contextvars
+import io
+import logging
+import os
+import shutil
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from profiling import stage
+
+# Taxa de amostragem do áudio gerado pelo Tortoise
+SAMPLE_RATE = 24000
+
+# Tamanho do cabeçalho de um WAV PCM simples (RIFF + fmt + data)
+WAV_HEADER_SIZE = 44
+
+# Formatos suportados e o tipo MIME correspondente para o st.audio
+AUDIO_FORMATS = {
+    'wav': 'audio/wav',
+    'flac': 'audio/flac',
+    'opus': 'audio/ogg',
+}
+
+# Uma única thread de escrita em disco compartilhada por todo o processo
+_disk_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='audio-sink')
+
+
+# Converte o tensor gerado (1, S) em amostras int16 já intercaladas por canal
+def to_pcm16(gen):
+    samples = gen.detach().cpu().numpy() if hasattr(gen, 'detach') else np.asarray(gen)
+    samples = np.atleast_2d(samples).T
+    # Áudio já armazenado em int16 (ver LongformAssembler) não precisa de conversão
+    if samples.dtype == np.int16:
+        return samples.astype('<i2', copy=False)
+    # Em float16, 32767 arredonda para 32768 e estouraria o int16; a escala é feita em float32
+    return (np.clip(samples.astype(np.float32, copy=False), -1.0, 1.0) * 32767).astype('<i2')
+
+
+# Codifica o áudio como WAV PCM 16 bits direto em um único buffer pré-alocado,
+# sem arquivo temporário, e devolve uma memoryview sobre ele (sem cópia)
+def encode_wav(gen, sample_rate=SAMPLE_RATE):
+    pcm = to_pcm16(gen)
+    num_channels = pcm.shape[1]
+    data_size = pcm.size * 2
+    buffer = bytearray(WAV_HEADER_SIZE + data_size)
+    struct.pack_into(
+        '<4sI4s4sIHHIIHH4sI', buffer, 0,
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, num_channels, sample_rate,
+        sample_rate * num_channels * 2, num_channels * 2, 16,
+        b'data', data_size
+    )
+    np.frombuffer(buffer, dtype='<i2', offset=WAV_HEADER_SIZE)[:] = pcm.ravel()
+    return memoryview(buffer)
+
+
+# Lê um WAV PCM 16 bits (como os gravados por encode_wav) sem decodificar as amostras:
+# devolve (canais, taxa de amostragem, memoryview dos dados PCM)
+def read_wav_pcm(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    riff, _, wave = struct.unpack_from('<4sI4s', data, 0)
+    if riff != b'RIFF' or wave != b'WAVE':
+        raise ValueError(f"{path} não é um arquivo WAV.")
+    offset, num_channels, sample_rate = 12, 1, SAMPLE_RATE
+    while offset + 8 <= len(data):
+        chunk_id, chunk_size = struct.unpack_from('<4sI', data, offset)
+        if chunk_id == b'fmt ':
+            audio_format, num_channels, sample_rate = struct.unpack_from('<HHI', data, offset + 8)
+            bits = struct.unpack_from('<H', data, offset + 22)[0]
+            if audio_format != 1 or bits != 16:
+                raise ValueError(f"{path} não é PCM 16 bits.")
+        elif chunk_id == b'data':
+            return num_channels, sample_rate, memoryview(data)[offset + 8:offset + 8 + chunk_size]
+        offset += 8 + chunk_size + (chunk_size & 1)
+    raise ValueError(f"{path} não tem dados de áudio.")
+
+
+# Lê um WAV PCM 16 bits e devolve as amostras float32 (canais, S)
+def read_wav(path):
+    num_channels, _, pcm = read_wav_pcm(path)
+    samples = np.frombuffer(pcm, dtype='<i2')
+    return (samples.reshape(-1, num_channels).T / 32767.0).astype(np.float32)
+
+
+# Cabeçalho WAV para transmissão contínua, quando o tamanho final ainda não é conhecido
+# (tamanhos no valor máximo, como fazem ffmpeg e sox ao gravar em pipe)
+def streaming_wav_header(sample_rate=SAMPLE_RATE, num_channels=1):
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 0xFFFFFFFF, b'WAVE',
+        b'fmt ', 16, 1, num_channels, sample_rate,
+        sample_rate * num_channels * 2, num_channels * 2, 16,
+        b'data', 0xFFFFFFFF
+    )
+
+
+# Codifica em FLAC ou Opus usando o soundfile (opcional, só é importado quando usado)
+def _encode_soundfile(gen, sample_rate, audio_format):
+    import soundfile as sf
+
+    buffer = io.BytesIO()
+    if audio_format == 'flac':
+        sf.write(buffer, to_pcm16(gen), sample_rate, format='FLAC')
+    else:
+        sf.write(buffer, to_pcm16(gen), sample_rate, format='OGG', subtype='OPUS')
+    return buffer.getbuffer()
+
+
+# Codifica o áudio no formato pedido e devolve uma memoryview com o arquivo completo
+def encode_audio(gen, sample_rate=SAMPLE_RATE, audio_format='wav'):
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"Formato de áudio não suportado: {audio_format}")
+    if audio_format == 'wav':
+        return encode_wav(gen, sample_rate)
+    return _encode_soundfile(gen, sample_rate, audio_format)
+
+
+# Grava o buffer em disco de forma atômica (usado pela thread de escrita)
+def _write_file(path, data, name=None):
+    with stage('disk_write', chunk=name):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    logging.info(f"Áudio salvo em {path}.")
+
+
+# Reaproveita um arquivo já gravado: link físico (sem cópia) ou, se não for possível, cópia
+def _reuse_file(path, source_path):
+    tmp_path = path + '.tmp'
+    try:
+        os.link(source_path, tmp_path)
+    except OSError:
+        shutil.copyfile(source_path, tmp_path)
+    os.replace(tmp_path, path)
+
+
+# Chama on_written() quando a gravação termina sem erro (na thread de escrita)
+def _notify_when_written(future, on_written):
+    if on_written is not None:
+        future.add_done_callback(lambda f: f.exception() is None and on_written())
+    return future
+
+
+# Saída de áudio em memória. Cada chamada de write() devolve o arquivo codificado como
+# memoryview; salvar em disco é opcional e acontece em segundo plano.
+class AudioSink:
+    def __init__(self, persist_dir=None, audio_format='wav', sample_rate=SAMPLE_RATE):
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Formato de áudio não suportado: {audio_format}")
+        self.persist_dir = persist_dir
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.mime_type = AUDIO_FORMATS[audio_format]
+        self._pending = []
+        if persist_dir is not None:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    def path_for(self, name):
+        return os.path.join(self.persist_dir, f'{name}.{self.audio_format}')
+
+    # on_written é chamado (na thread de escrita) quando o arquivo já está no lugar
+    def write(self, name, gen, on_written=None):
+        with stage('encode', chunk=name):
+            encoded = encode_audio(gen, self.sample_rate, self.audio_format)
+        if self.persist_dir is not None:
+            # A thread de escrita herda o contexto (profiler ativo) de quem pediu a gravação
+            context = contextvars.copy_context()
+            future = _disk_writer.submit(context.run, _write_file, self.path_for(name), encoded, name)
+            self._pending.append(_notify_when_written(future, on_written))
+        return encoded
+
+    # Usa um arquivo já codificado (de um trabalho anterior) como a parte `name`, sem recodificar
+    def reuse(self, name, source_path, on_written=None):
+        if self.persist_dir is not None:
+            future = _disk_writer.submit(_reuse_file, self.path_for(name), source_path)
+            self._pending.append(_notify_when_written(future, on_written))
+
+    # Espera as gravações pendentes; erros de escrita são propagados aqui
+    def wait(self):
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
@@ -0,0 +1,296 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from audio_sink import SAMPLE_RATE, encode_wav
+from jobs import parse_ar_batch
+from longform import (PRESET_AUTOREGRESSIVE_SAMPLES, SAMPLES_PER_CHAR, LongformAssembler, estimate_samples,
+                      iter_longform, split_text)
+from profiling import Profiler
+from voice_cache import CONDITIONING_SAMPLE_RATE, _latent_memo, get_conditioning_latents
+
+# Diretório onde os resultados de cada execução são guardados (um JSON por execução)
+BENCHMARK_RESULTS_DIR = os.path.join("results", "benchmarks")
+
+# Parágrafo repetido para montar os textos de cada tamanho (sempre o mesmo, para comparar execuções)
+BENCHMARK_PARAGRAPH = (
+    "The quick brown fox jumps over the lazy dog. Voice cloning systems turn a short reference "
+    "recording into a model of the speaker, and then read any text in that voice. Long texts are "
+    "split into sentences, each one synthesized on its own and joined at the end. "
+)
+
+DEFAULT_TEXT_LENGTHS = (200, 1000, 4000)
+DEFAULT_PRESETS = ('ultra_fast', 'fast', 'standard')
+DEFAULT_THREADS = (1, os.cpu_count() or 1)
+DEFAULT_AR_BATCHES = (1,)
+
+# Custo simulado pelo modelo falso: uma multiplicação de matrizes deste tamanho por
+# candidato autorregressivo e por bloco de caracteres da parte
+STUB_MATRIX_SIZE = 128
+STUB_CHARS_PER_BLOCK = 50
+
+
+# TextToSpeech falso para rodar o benchmark sem pesos nem rede. Tem a mesma interface usada
+# pelo app (tts_with_preset, get_conditioning_latents, autoregressive_batch_size), devolve
+# áudio com a duração típica da fala para o texto e gasta CPU proporcional ao preset.
+class StubTextToSpeech:
+    def __init__(self, matrix_size=STUB_MATRIX_SIZE, chars_per_block=STUB_CHARS_PER_BLOCK):
+        self.matrix_size = matrix_size
+        self.chars_per_block = chars_per_block
+        self.autoregressive_batch_size = 1
+
+    def get_conditioning_latents(self, voice_samples):
+        audio = torch.cat([s.reshape(-1) for s in voice_samples])
+        generator = torch.Generator().manual_seed(len(audio))
+        return torch.randn(1, 1024, generator=generator), torch.randn(1, 2048, generator=generator)
+
+    def tts_with_preset(self, text, voice_samples=None, conditioning_latents=None, preset='fast', k=1,
+                        use_deterministic_seed=None, **kwargs):
+        generator = torch.Generator().manual_seed(use_deterministic_seed or 0)
+        num_candidates = PRESET_AUTOREGRESSIVE_SAMPLES[preset]
+        blocks = max(1, len(text) // self.chars_per_block)
+        batch_size = max(1, self.autoregressive_batch_size)
+        weights = torch.randn(self.matrix_size, self.matrix_size, generator=generator)
+        for _ in range(blocks * (num_candidates // batch_size)):
+            hidden = torch.randn(batch_size, self.matrix_size, generator=generator)
+            torch.tanh(hidden @ weights)
+        num_samples = len(text) * SAMPLES_PER_CHAR
+        return (torch.randn(1, 1, num_samples, generator=generator) * 0.1).clamp_(-1.0, 1.0)
+
+
+# Texto de benchmark com aproximadamente o tamanho pedido, terminando em fim de frase
+def make_text(length):
+    text = BENCHMARK_PARAGRAPH * (length // len(BENCHMARK_PARAGRAPH) + 1)
+    cut = text.rfind('. ', 0, length)
+    return text[:cut + 1] if cut > 0 else text[:length]
+
+
+# Executa a função várias vezes e devolve o melhor tempo e a mediana (em segundos)
+def time_calls(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {'best_seconds': min(timings), 'median_seconds': statistics.median(timings), 'repeat': repeat}
+
+
+# Mede uma geração completa: tempo até a primeira parte, fator de tempo real,
+# partes por segundo e pico de memória residente durante a geração, com `batch_size`
+# candidatos autorregressivos por passada (None/1, 'auto' ou N)
+def bench_generation(tts, conditioning_latents, text_length, preset, num_threads, seed=0, batch_size=None):
+    torch.set_num_threads(num_threads)
+    texts = split_text(make_text(text_length))
+    assembler = LongformAssembler(estimate_samples(texts))
+    profiler = Profiler(f'bench-{preset}-{text_length}-{num_threads}-{batch_size or 1}', events_path=None)
+
+    first_part_seconds = None
+    start = time.perf_counter()
+    with profiler.activate():
+        for _, gen in iter_longform(tts, texts, conditioning_latents, preset=preset, seed=seed,
+                                    batch_size=batch_size):
+            if first_part_seconds is None:
+                first_part_seconds = time.perf_counter() - start
+            assembler.append(gen)
+    total_seconds = time.perf_counter() - start
+
+    audio_seconds = assembler.length / SAMPLE_RATE
+    chunk_stats = profiler.summary()['stages'].get('chunk', {})
+    return {
+        'text_length': text_length,
+        'preset': preset,
+        'threads': num_threads,
+        'ar_batch': batch_size or 1,
+        'parts': len(texts),
+        'first_part_seconds': first_part_seconds,
+        'total_seconds': total_seconds,
+        'audio_seconds': audio_seconds,
+        'real_time_factor': total_seconds / audio_seconds if audio_seconds else None,
+        'parts_per_second': len(texts) / total_seconds if total_seconds else None,
+        'peak_rss_bytes': chunk_stats.get('peak_rss_bytes'),
+    }
+
+
+# Cria uma voz de teste (dois clipes de 6 s de ruído) para medir o cache de latentes
+def _write_test_voice(voice_dir):
+    rng = np.random.default_rng(0)
+    for i in range(2):
+        clip = rng.uniform(-0.1, 0.1, CONDITIONING_SAMPLE_RATE * 6).astype(np.float32)
+        with open(os.path.join(voice_dir, f'clip_{i}.wav'), 'wb') as f:
+            f.write(encode_wav(clip, CONDITIONING_SAMPLE_RATE))
+
+
+# Mede as etapas que não dependem do modelo: divisão do texto, codificação WAV,
+# montagem do áudio longo e leitura dos latentes (cálculo, cache em disco e em memória)
+def bench_stages(tts, text_lengths, repeat=5):
+    stages = {}
+    for length in text_lengths:
+        text = make_text(length)
+        stages[f'text_split_{length}'] = time_calls(lambda: split_text(text), repeat)
+
+    audio = torch.rand(1, SAMPLE_RATE * 60) * 2 - 1
+    stages['encode_wav_60s'] = time_calls(lambda: encode_wav(audio, SAMPLE_RATE), repeat)
+
+    parts = [torch.rand(1, SAMPLE_RATE * 5) for _ in range(24)]
+
+    def assemble():
+        assembler = LongformAssembler(SAMPLE_RATE * 5 * 24)
+        for gen in parts:
+            assembler.append(gen)
+        return assembler.result()
+
+    stages['assemble_24x5s'] = time_calls(assemble, repeat)
+    # Referência: concatenação como no app original
+    stages['torch_cat_24x5s'] = time_calls(lambda: torch.cat(parts, dim=-1), repeat)
+
+    work_dir = tempfile.mkdtemp(prefix='tts-bench-')
+    try:
+        voice_dir = os.path.join(work_dir, 'voice')
+        cache_dir = os.path.join(work_dir, 'latents')
+        os.makedirs(voice_dir)
+        _write_test_voice(voice_dir)
+
+        def cold():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            _latent_memo.clear()
+            get_conditioning_latents(tts, 'bench', voice_dir, cache_dir)
+
+        def disk_hit():
+            _latent_memo.clear()
+            get_conditioning_latents(tts, 'bench', voice_dir, cache_dir)
+
+        stages['latents_compute'] = time_calls(cold, repeat)
+        stages['latents_disk_hit'] = time_calls(disk_hit, repeat)
+        stages['latents_memory_hit'] = time_calls(
+            lambda: get_conditioning_latents(tts, 'bench', voice_dir, cache_dir), repeat)
+    finally:
+        _latent_memo.clear()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return stages
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(tts, model_name, text_lengths=DEFAULT_TEXT_LENGTHS, presets=DEFAULT_PRESETS,
+                   threads=DEFAULT_THREADS, repeat=5, batch_sizes=DEFAULT_AR_BATCHES):
+    conditioning_latents = tts.get_conditioning_latents([torch.zeros(1, CONDITIONING_SAMPLE_RATE)])
+    # Uma geração curta antes das medições, para não contar a inicialização do torch
+    bench_generation(tts, conditioning_latents, min(text_lengths), presets[0], threads[0])
+
+    generation = []
+    for num_threads in threads:
+        for preset in presets:
+            for length in text_lengths:
+                for batch_size in batch_sizes:
+                    result = bench_generation(tts, conditioning_latents, length, preset, num_threads,
+                                              batch_size=batch_size)
+                    logging.info(f"{preset} / {length} caracteres / {num_threads} thread(s) / lote "
+                                 f"{batch_size}: RTF {result['real_time_factor']:.3f}, primeira parte em "
+                                 f"{result['first_part_seconds']:.2f}s")
+                    generation.append(result)
+
+    return {
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'model': model_name,
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'cpu_count': os.cpu_count(),
+        'generation': generation,
+        'stages': bench_stages(tts, text_lengths, repeat),
+    }
+
+
+def save_results(results, output_path=None):
+    if output_path is None:
+        name = f"{results['commit'] or 'local'}-{results['timestamp'].replace(':', '')}.json"
+        output_path = os.path.join(BENCHMARK_RESULTS_DIR, name)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+    return output_path
+
+
+# Compara dois arquivos de resultado (antes e depois) e mostra a razão novo/antigo de cada medida
+def compare_results(baseline_path, candidate_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(candidate_path, 'r', encoding='utf-8') as f:
+        candidate = json.load(f)
+
+    # Resultados anteriores ao --ar-batch foram todos medidos com lote 1
+    def generation_key(r):
+        return r['preset'], r['text_length'], r['threads'], r.get('ar_batch', 1)
+
+    lines = [f"{baseline.get('commit')} -> {candidate.get('commit')} (razão < 1 é melhora)"]
+    old_runs = {generation_key(r): r for r in baseline['generation']}
+    for new in candidate['generation']:
+        old = old_runs.get(generation_key(new))
+        if old is None:
+            continue
+        for metric in ('first_part_seconds', 'real_time_factor', 'peak_rss_bytes'):
+            if old.get(metric) and new.get(metric) is not None:
+                lines.append(f"{new['preset']}/{new['text_length']}/{new['threads']}t/"
+                             f"b{new.get('ar_batch', 1)} {metric}: "
+                             f"{old[metric]:.4g} -> {new[metric]:.4g} ({new[metric] / old[metric]:.2f}x)")
+    for name, new in candidate['stages'].items():
+        old = baseline['stages'].get(name)
+        if old and old['best_seconds']:
+            lines.append(f"{name}: {old['best_seconds'] * 1000:.3f}ms -> {new['best_seconds'] * 1000:.3f}ms "
+                         f"({new['best_seconds'] / old['best_seconds']:.2f}x)")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark da síntese de textos longos: tempo até a primeira parte, fator de tempo real, "
+                    "partes por segundo, pico de memória e etapas sem o modelo.")
+    parser.add_argument('--model', choices=['stub', 'tortoise'], default='stub',
+                        help="'stub' roda offline com um modelo falso; 'tortoise' usa os pesos reais.")
+    parser.add_argument('--lengths', type=int, nargs='+', default=list(DEFAULT_TEXT_LENGTHS),
+                        help="Tamanhos de texto (em caracteres).")
+    parser.add_argument('--presets', nargs='+', default=list(DEFAULT_PRESETS),
+                        choices=sorted(PRESET_AUTOREGRESSIVE_SAMPLES))
+    parser.add_argument('--threads', type=int, nargs='+', default=sorted(set(DEFAULT_THREADS)),
+                        help="Números de threads do torch a medir.")
+    parser.add_argument('--ar-batch', type=parse_ar_batch, nargs='+', default=list(DEFAULT_AR_BATCHES),
+                        help="Lotes autorregressivos a medir: 1, 'auto' e/ou N (ex.: --ar-batch 1 auto 8).")
+    parser.add_argument('--repeat', type=int, default=5, help="Repetições de cada etapa sem o modelo.")
+    parser.add_argument('--output', default=None, help="Arquivo JSON de saída (padrão: results/benchmarks/).")
+    parser.add_argument('--compare', nargs=2, metavar=('ANTES', 'DEPOIS'),
+                        help="Compara dois arquivos de resultado em vez de medir.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.compare:
+        print(compare_results(*args.compare))
+        return
+
+    if args.model == 'tortoise':
+        from lazy_tts import load_text_to_speech
+        tts = load_text_to_speech()
+    else:
+        tts = StubTextToSpeech()
+    results = run_benchmarks(tts, args.model, args.lengths, args.presets, args.threads, args.repeat,
+                             args.ar_batch)
+    logging.info(f"Resultados salvos em {save_results(results, args.output)}.")
+
+
+if __name__ == '__main__':
+    main()
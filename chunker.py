@@ -0,0 +1,224 @@
+import heapq
+import re
+from collections import Counter
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+# Tamanho desejado e maior parte aceita (como no split_and_recombine_text do Tortoise: 200 e 300
+# caracteres). O limite de 300 só é usado por frases que não dá para cortar antes dele.
+TARGET_CHUNK_CHARS = 200
+MAX_CHUNK_CHARS = 300
+
+# Velocidade de fala usada para estimar a duração de cada parte (a mesma do LongformAssembler)
+SPEECH_CHARS_PER_SECOND = 14
+
+# O tokenizador do Tortoise tem vocabulário pequeno: pouco mais de um caractere por token
+CHARS_PER_TOKEN = 1.5
+
+# Modelo de custo de uma parte, em segundos de CPU relativos: um custo fixo por chamada
+# (latentes, amostragem de candidatos, CLVP) mais termos proporcionais aos tokens de texto
+# e à duração do áudio (tokens de mel no autorregressivo, difusão e vocoder)
+CHUNK_OVERHEAD_COST = 2.0
+TOKEN_COST = 0.02
+DURATION_COST = 1.0
+
+# Uma parte é dividida em orações quando passa deste múltiplo do tamanho ideal
+REFINE_FACTOR = 1.25
+
+# Quantas quantidades de partes além do mínimo são avaliadas para cada plano
+EXTRA_CHUNK_COUNTS = 4
+
+# Fim de frase: pontuação final seguida de aspas ou parênteses que a fecham (que ficam na
+# frase), ou uma linha em branco
+_SENTENCE_END = re.compile(r'[.!?…]["\')\]]*(?=\s)|\n\s*\n')
+_CLAUSE_END = re.compile(r'(?<=[,;:—–])\s+')
+
+
+def estimate_tokens(text):
+    return max(1, round(len(text) / CHARS_PER_TOKEN))
+
+
+def estimate_duration(text):
+    return len(text) / SPEECH_CHARS_PER_SECOND
+
+
+# Custo estimado de sintetizar uma parte com o texto dado
+def chunk_cost(text):
+    return CHUNK_OVERHEAD_COST + TOKEN_COST * estimate_tokens(text) + DURATION_COST * estimate_duration(text)
+
+
+# Frases do texto (linhas em branco também encerram frase), com os espaços normalizados.
+# O texto é fatiado nos fins de frase, então nenhum caractere além de espaços é descartado.
+def split_sentences(text):
+    pieces = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        pieces.append(text[start:match.end()])
+        start = match.end()
+    pieces.append(text[start:])
+    return [' '.join(s.split()) for s in pieces if s.strip()]
+
+
+def split_clauses(sentence):
+    return [c.strip() for c in _CLAUSE_END.split(sentence) if c.strip()]
+
+
+# Corta um trecho sem pontuação em pedaços de no máximo max_chars, sempre entre palavras
+def split_words(text, max_chars=MAX_CHUNK_CHARS):
+    pieces = []
+    current = ''
+    for word in text.split():
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f'{current} {word}' if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+# Quebra uma frase em orações, e orações longas demais em grupos de palavras
+def _clause_units(sentence, max_chars):
+    units = []
+    for clause in split_clauses(sentence):
+        units.extend(split_words(clause, max_chars) if len(clause) > max_chars else [clause])
+    return units
+
+
+# Agrupa unidades consecutivas em partes de custo até `limit` (guloso, na ordem do texto)
+def _pack(units, limit, max_chars):
+    chunks = []
+    current = []
+    for unit in units:
+        candidate = ' '.join(current + [unit])
+        if current and (chunk_cost(candidate) > limit or len(candidate) > max_chars):
+            chunks.append(' '.join(current))
+            current = [unit]
+        else:
+            current.append(unit)
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+# Divisão em no máximo `count` partes consecutivas que minimiza o custo da maior parte
+# (busca binária sobre o limite de custo, com o empacotamento guloso como teste)
+def _balanced_partition(units, count, max_chars):
+    low = max(chunk_cost(u) for u in units)
+    high = chunk_cost(' '.join(units))
+    best = _pack(units, high, max_chars)
+    for _ in range(40):
+        if high - low < 1e-3:
+            break
+        middle = (low + high) / 2
+        chunks = _pack(units, middle, max_chars)
+        if len(chunks) <= count:
+            best, high = chunks, middle
+        else:
+            low = middle
+    return best
+
+
+# Tempo total estimado para processar as partes em `workers` processos (ou lotes) em paralelo:
+# cada parte vai para quem ficar livre primeiro, na ordem do texto
+def estimate_makespan(chunks, workers=1):
+    finish_times = [0.0] * max(1, workers)
+    for chunk in chunks:
+        heapq.heapreplace(finish_times, finish_times[0] + chunk_cost(chunk))
+    return max(finish_times)
+
+
+# Melhor plano para uma lista de unidades: testa algumas quantidades de partes e fica com a de
+# menor tempo total estimado (em empate, a com menos partes, que corta menos a prosódia).
+# A menor quantidade testada é a que cabe em partes de target_chars: o custo fixo por parte
+# sempre favorece partes maiores, mas a qualidade do Tortoise cai perto do limite.
+def _best_plan(units, workers, max_chars, target_chars=TARGET_CHUNK_CHARS):
+    minimum = len(_pack(units, float('inf'), min(target_chars, max_chars)))
+    upper = min(len(units), max(minimum, workers) + EXTRA_CHUNK_COUNTS * workers)
+    best_plan, best_makespan = None, None
+    for count in range(minimum, upper + 1):
+        plan = _balanced_partition(units, count, max_chars)
+        makespan = estimate_makespan(plan, workers)
+        if best_makespan is None or makespan < best_makespan - 1e-9:
+            best_plan, best_makespan = plan, makespan
+    return best_plan
+
+
+# Planejador de partes: divide o texto em frases (ou orações, para frases longas) e as agrupa
+# para minimizar o tempo total estimado com `workers` processos ou lotes em paralelo.
+# Cortes ficam sempre em fim de frase; uma frase só é dividida em orações quando sozinha
+# dominaria o tempo total. As partes ficam em torno de target_chars e nunca passam de max_chars.
+# O plano de cada texto é memorizado.
+@lru_cache(maxsize=256)
+def plan_chunks(text, workers=1, max_chars=MAX_CHUNK_CHARS, target_chars=TARGET_CHUNK_CHARS):
+    sentences = split_sentences(text)
+    if not sentences:
+        return ()
+    # Cada unidade é uma frase ou a lista das orações que a compõem
+    groups = [[s] if len(s) <= max_chars else _clause_units(s, max_chars) for s in sentences]
+
+    while True:
+        units = [u for group in groups for u in group]
+        plan = _best_plan(units, workers, max_chars, target_chars)
+        ideal = sum(chunk_cost(u) for u in units) / max(1, workers)
+        largest = max(plan, key=chunk_cost)
+        # Se a maior parte é uma frase inteira bem acima do ideal, tenta de novo com ela em orações
+        refined = False
+        if workers > 1 and chunk_cost(largest) > REFINE_FACTOR * ideal:
+            for i, group in enumerate(groups):
+                if len(group) == 1 and group[0] == largest:
+                    clauses = _clause_units(group[0], max_chars)
+                    if len(clauses) > 1:
+                        groups[i] = clauses
+                        refined = True
+                    break
+        if not refined:
+            return tuple(plan)
+
+
+# Plano para um texto editado, reaproveitando as partes de um plano anterior: as frases novas
+# são alinhadas às antigas (difflib) e cada parte antiga cujas frases continuam todas iguais e
+# em sequência é mantida como está. Só os trechos inseridos ou alterados são planejados de novo.
+# Devolve as partes e, para cada uma, o índice da parte antiga reaproveitada (ou None).
+def plan_incremental(previous_chunks, text, workers=1, max_chars=MAX_CHUNK_CHARS):
+    previous_sentences = []
+    owner = []
+    for i, chunk in enumerate(previous_chunks):
+        for sentence in split_sentences(chunk):
+            previous_sentences.append(sentence)
+            owner.append(i)
+    chunk_sizes = Counter(owner)
+    sentences = split_sentences(text)
+
+    matched = {}
+    matcher = SequenceMatcher(a=previous_sentences, b=sentences, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            matched.update((j1 + n, i1 + n) for n in range(i2 - i1))
+
+    chunks, reused, pending = [], [], []
+
+    def flush():
+        if pending:
+            planned = plan_chunks(' '.join(pending), workers, max_chars)
+            chunks.extend(planned)
+            reused.extend([None] * len(planned))
+            pending.clear()
+
+    j = 0
+    while j < len(sentences):
+        i = matched.get(j)
+        # Uma parte antiga só é reaproveitada inteira, começando na primeira frase dela
+        if i is not None and (i == 0 or owner[i - 1] != owner[i]):
+            size = chunk_sizes[owner[i]]
+            if all(matched.get(j + n) == i + n for n in range(size)):
+                flush()
+                chunks.append(previous_chunks[owner[i]])
+                reused.append(owner[i])
+                j += size
+                continue
+        pending.append(sentences[j])
+        j += 1
+    flush()
+    return chunks, reused
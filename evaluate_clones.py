@@ -0,0 +1,219 @@
+import argparse
+import csv
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Taxa comum usada para comparar os áudios (original e clonado podem ter taxas diferentes)
+EVAL_SAMPLE_RATE = 22050
+N_MFCC = 13
+
+# Cache das características já extraídas, indexado pelo hash do arquivo
+FEATURE_CACHE_DIR = os.path.join("cache", "features")
+
+# Colunas do relatório, na ordem em que são escritas
+REPORT_COLUMNS = [
+    'reference', 'clone', 'reference_seconds', 'clone_seconds',
+    'mfcc_dtw_distance', 'mfcc_truncated_distance',
+    'zcr_diff', 'centroid_diff', 'rms_diff', 'harmonic_ratio_diff', 'error',
+]
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Extrai as características de um arquivo (as mesmas do notebook 3_Resultados, sem gráficos)
+def extract_features(path):
+    import librosa
+
+    audio, _ = librosa.load(path, sr=EVAL_SAMPLE_RATE, mono=True)
+    harmonic, percussive = librosa.effects.hpss(audio)
+    harmonic_energy = float(np.sum(harmonic ** 2))
+    total_energy = harmonic_energy + float(np.sum(percussive ** 2))
+    return {
+        'seconds': np.float64(len(audio) / EVAL_SAMPLE_RATE),
+        'mfcc': librosa.feature.mfcc(y=audio, sr=EVAL_SAMPLE_RATE, n_mfcc=N_MFCC).astype(np.float32),
+        'zcr': librosa.feature.zero_crossing_rate(audio)[0].astype(np.float32),
+        'centroid': librosa.feature.spectral_centroid(y=audio, sr=EVAL_SAMPLE_RATE)[0].astype(np.float32),
+        'rms': librosa.feature.rms(y=audio)[0].astype(np.float32),
+        'harmonic_ratio': np.float64(harmonic_energy / total_energy if total_energy else 0.0),
+    }
+
+
+# Características de um arquivo, lidas do cache quando o conteúdo não mudou
+def load_features(path, cache_dir=FEATURE_CACHE_DIR):
+    cache_path = os.path.join(cache_dir, f'{file_hash(path)}.npz')
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as data:
+            return {key: data[key] for key in data.files}
+
+    features = extract_features(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Nome temporário único: processos do pool avaliando o mesmo arquivo não gravam no mesmo lugar
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(cache_path) + '.', suffix='.tmp', dir=cache_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **features)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return features
+
+
+# Versão de load_features para o pool: um arquivo ilegível vira uma mensagem de erro em vez de
+# interromper a avaliação dos demais
+def try_load_features(path, cache_dir=FEATURE_CACHE_DIR):
+    try:
+        return load_features(path, cache_dir), None
+    except Exception as e:
+        return None, f"{path}: {e}"
+
+
+# Matriz de distâncias euclidianas entre todos os quadros de A e B, sem laços em Python
+def pairwise_distances(a, b):
+    a_sq = np.sum(a ** 2, axis=0)[:, None]
+    b_sq = np.sum(b ** 2, axis=0)[None, :]
+    squared = np.maximum(a_sq + b_sq - 2.0 * (a.T @ b), 0.0)
+    return np.sqrt(squared)
+
+
+# Distância entre MFCCs com alinhamento DTW (em vez de truncar no menor comprimento),
+# normalizada pelo tamanho do caminho de alinhamento
+def mfcc_dtw_distance(mfcc1, mfcc2):
+    import librosa
+
+    cost = pairwise_distances(mfcc1.astype(np.float64), mfcc2.astype(np.float64))
+    accumulated, path = librosa.sequence.dtw(C=cost)
+    return float(accumulated[-1, -1] / len(path))
+
+
+# Distância do notebook original (truncando no menor comprimento), mantida para comparação
+def mfcc_truncated_distance(mfcc1, mfcc2):
+    min_length = min(mfcc1.shape[1], mfcc2.shape[1])
+    return float(np.mean(np.linalg.norm(mfcc1[:, :min_length] - mfcc2[:, :min_length], axis=0)))
+
+
+def score_pair(reference_path, clone_path, reference, clone):
+    return {
+        'reference': reference_path,
+        'clone': clone_path,
+        'reference_seconds': float(reference['seconds']),
+        'clone_seconds': float(clone['seconds']),
+        'mfcc_dtw_distance': mfcc_dtw_distance(reference['mfcc'], clone['mfcc']),
+        'mfcc_truncated_distance': mfcc_truncated_distance(reference['mfcc'], clone['mfcc']),
+        'zcr_diff': float(abs(reference['zcr'].mean() - clone['zcr'].mean())),
+        'centroid_diff': float(abs(reference['centroid'].mean() - clone['centroid'].mean())),
+        'rms_diff': float(abs(reference['rms'].mean() - clone['rms'].mean())),
+        'harmonic_ratio_diff': float(abs(reference['harmonic_ratio'] - clone['harmonic_ratio'])),
+        'error': None,
+    }
+
+
+# Linha do relatório para um par que não pôde ser avaliado
+def failed_pair(reference_path, clone_path, error):
+    row = dict.fromkeys(REPORT_COLUMNS)
+    row.update(reference=reference_path, clone=clone_path, error=error)
+    return row
+
+
+# Versão de score_pair para o pool: o erro de um par fica na linha dele no relatório
+def try_score_pair(reference_path, clone_path, reference, clone):
+    try:
+        return score_pair(reference_path, clone_path, reference, clone)
+    except Exception as e:
+        return failed_pair(reference_path, clone_path, str(e))
+
+
+# Avalia todos os pares: características uma vez por arquivo e pares em paralelo. Um arquivo ou
+# par com erro não interrompe o lote; ele aparece no relatório com a coluna 'error' preenchida.
+def evaluate(pairs, num_workers=None, cache_dir=FEATURE_CACHE_DIR):
+    unique_paths = sorted({path for pair in pairs for path in pair})
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        loaded = dict(zip(unique_paths, pool.map(try_load_features, unique_paths, [cache_dir] * len(unique_paths))))
+        errors = {path: error for path, (_, error) in loaded.items() if error is not None}
+        for error in errors.values():
+            logging.error(f"Características não extraídas: {error}")
+        logging.info(f"Características de {len(unique_paths) - len(errors)}/{len(unique_paths)} arquivo(s) prontas.")
+
+        valid = [(r, c) for r, c in pairs if r not in errors and c not in errors]
+        scored = iter(pool.map(
+            try_score_pair,
+            [r for r, _ in valid], [c for _, c in valid],
+            [loaded[r][0] for r, _ in valid], [loaded[c][0] for _, c in valid]
+        ))
+        # O relatório mantém a ordem dos pares
+        rows = []
+        for r, c in pairs:
+            if r in errors or c in errors:
+                rows.append(failed_pair(r, c, '; '.join(errors[p] for p in (r, c) if p in errors)))
+            else:
+                rows.append(next(scored))
+        return rows
+
+
+# Lê os pares de um CSV com as colunas 'reference' e 'clone'
+def read_pairs_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [(row['reference'], row['clone']) for row in csv.DictReader(f)]
+
+
+# Forma pares por nome de arquivo entre uma pasta de originais e uma de clones
+def match_pairs(reference_dir, clone_dir):
+    pairs = []
+    for f in sorted(os.listdir(clone_dir)):
+        reference_path = os.path.join(reference_dir, f)
+        if os.path.exists(reference_path):
+            pairs.append((reference_path, os.path.join(clone_dir, f)))
+    return pairs
+
+
+def write_report(rows, output_path):
+    if output_path.endswith('.parquet'):
+        import pandas as pd
+        pd.DataFrame(rows, columns=REPORT_COLUMNS).to_parquet(output_path, index=False)
+        return
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Avalia em lote a qualidade de áudios clonados em relação aos originais.")
+    parser.add_argument('--pairs', help="CSV com as colunas 'reference' e 'clone'.")
+    parser.add_argument('--reference-dir', help="Pasta com os áudios originais (pareados por nome de arquivo).")
+    parser.add_argument('--clone-dir', help="Pasta com os áudios clonados.")
+    parser.add_argument('--output', default='avaliacao.csv', help="Relatório de saída (.csv ou .parquet).")
+    parser.add_argument('--workers', type=int, default=None, help="Processos em paralelo (padrão: núcleos).")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.pairs:
+        pairs = read_pairs_csv(args.pairs)
+    elif args.reference_dir and args.clone_dir:
+        pairs = match_pairs(args.reference_dir, args.clone_dir)
+    else:
+        parser.error("Informe --pairs ou --reference-dir e --clone-dir.")
+
+    rows = evaluate(pairs, args.workers)
+    write_report(rows, args.output)
+    failed = sum(1 for row in rows if row['error'])
+    logging.info(f"{len(rows) - failed} par(es) avaliado(s), {failed} com erro; relatório salvo em {args.output}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import logging
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import torch
+
+from lazy_tts import load_text_to_speech
+from longform import generation_variant, resolve_batch_size, synthesize_part
+from profiling import Profiler, add_events, instrument_tts, stage
+from result_cache import chunk_key
+
+# Modelo de cada processo do pool (carregado uma vez, no inicializador)
+_worker_tts = None
+
+
+def _init_worker(num_threads, loader):
+    global _worker_tts
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    # As etapas internas (autorregressivo, difusão...) também são medidas nos processos do pool
+    _worker_tts = instrument_tts(loader())
+
+
+def _worker_pid():
+    return os.getpid()
+
+
+# Devolve o áudio, o registro de candidatos usados na parte (com amostragem adaptativa) e os
+# eventos de tempo das etapas, que o processo do pedido junta ao profiler dele
+def _synthesize_chunk(text_part, conditioning_latents, preset, k, seed, batch_size, adaptive=None, chunk=None,
+                      num_candidates=None):
+    profiler = Profiler(None, events_path=None)
+    with profiler.activate(), profiler.stage('pool_chunk', chunk=chunk):
+        gen = synthesize_part(_worker_tts, text_part, conditioning_latents, preset, k, seed, batch_size, adaptive,
+                              chunk, num_candidates)
+    return gen.numpy(), adaptive.history[-1] if adaptive is not None else None, profiler.events
+
+
+def _worker_conditioning_latents(voice_name, voice_dir):
+    from voice_cache import get_conditioning_latents
+    return get_conditioning_latents(_worker_tts, voice_name, voice_dir)
+
+
+# Distribui as partes de um único pedido entre vários processos, cada um com o próprio modelo.
+# As partes são entregues na ordem do texto e cada uma usa a mesma semente que teria no laço
+# sequencial, então o áudio não depende de quantos processos existem nem de qual gerou cada parte.
+class ChunkPool:
+    def __init__(self, processes, num_threads=None, loader=load_text_to_speech, precision='fp32'):
+        self.processes = processes
+        # Modo de inferência dos modelos do pool (entra na chave do cache, como em longform)
+        self.precision = precision
+        if num_threads is None:
+            num_threads = max(1, (os.cpu_count() or 1) // processes)
+        self.num_threads = num_threads
+        self._loader = loader
+        self._executor = self._create_executor()
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.num_threads, self._loader)
+        )
+
+    # Um processo do pool morreu (ex.: falta de memória): o executor fica inutilizável, então é
+    # trocado por um novo e só o pedido em andamento é perdido
+    def _rebuild(self):
+        logging.warning("Um processo do pool de partes terminou inesperadamente; recriando o pool.")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._create_executor()
+
+    # Inicia todos os processos e espera os modelos carregarem
+    def warm_up(self):
+        start = time.perf_counter()
+        pids = set(self._executor.map(_worker_pid, range(self.processes)))
+        logging.info(f"Pool de partes pronto em {time.perf_counter() - start:.1f}s: "
+                     f"{len(pids)} processo(s) com {self.num_threads} thread(s) cada.")
+        return self
+
+    # Latentes de condicionamento calculados (ou lidos do cache em disco) em um processo do pool
+    # (com o pool quebrado, tenta de novo uma vez no pool recriado)
+    def conditioning_latents(self, voice_name, voice_dir):
+        try:
+            return self._executor.submit(_worker_conditioning_latents, voice_name, voice_dir).result()
+        except BrokenProcessPool:
+            self._rebuild()
+            return self._executor.submit(_worker_conditioning_latents, voice_name, voice_dir).result()
+
+    # Mesmo contrato de longform.iter_longform: entrega (j, gen) na ordem, assim que cada parte
+    # e todas as anteriores estão prontas
+    def iter_longform(self, texts, conditioning_latents, preset="fast", k=1, seed=None, batch_size=None,
+                      cache=None, voice_hash=None, adaptive=None, num_candidates=None):
+        batch_size = resolve_batch_size(batch_size, preset, adaptive, num_candidates)
+        variant = generation_variant(self.precision, adaptive, num_candidates)
+        use_cache = cache is not None and voice_hash is not None and seed is not None
+        # Sem semente fixa, sorteia uma só para o pedido inteiro, como se fosse sequencial
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+
+        pending = {}
+        keys = {}
+        cached = {}
+        for j, text_part in enumerate(texts):
+            if use_cache:
+                keys[j] = chunk_key(voice_hash, text_part, preset, k, seed, batch_size, variant)
+                with stage('cache_lookup', chunk=j):
+                    samples = cache.get(keys[j])
+                if samples is not None:
+                    cached[j] = torch.from_numpy(samples)
+                    continue
+            try:
+                pending[j] = self._executor.submit(_synthesize_chunk, text_part, conditioning_latents,
+                                                   preset, k, seed, batch_size, adaptive, j, num_candidates)
+            except BrokenProcessPool:
+                self._rebuild()
+                raise RuntimeError("O pool de partes foi reiniciado; o pedido precisa ser enviado de novo.")
+
+        try:
+            for j in range(len(texts)):
+                if j in cached:
+                    yield j, cached.pop(j)
+                    continue
+                with stage('chunk', chunk=j):
+                    try:
+                        samples, record, events = pending.pop(j).result()
+                    except BrokenProcessPool:
+                        # Falha só este pedido; os próximos usam o pool recriado
+                        self._rebuild()
+                        pending.clear()
+                        raise RuntimeError(f"Um processo do pool terminou ao gerar a parte {j + 1}.")
+                    gen = torch.from_numpy(samples)
+                    add_events(events)
+                    # O registro foi feito no processo do pool; guarda uma cópia no histórico local
+                    if record is not None:
+                        adaptive.history.append(record)
+                    if use_cache:
+                        with stage('cache_store'):
+                            cache.put(keys[j], gen)
+                yield j, gen
+        finally:
+            # Pedido interrompido: as partes que ainda não começaram não são geradas
+            for future in pending.values():
+                future.cancel()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Carrega um pool de partes já aquecido (usado como loader do LazyTTS nos workers da fila)
+def load_chunk_pool(processes, num_threads=None, model_loader=load_text_to_speech, precision='fp32'):
+    return ChunkPool(processes, num_threads, model_loader, precision).warm_up()
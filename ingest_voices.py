@@ -0,0 +1,220 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+# Taxa de amostragem que o Tortoise usa para os clipes de condicionamento
+TARGET_SAMPLE_RATE = 22050
+
+# Duração recomendada para cada clipe de referência (em segundos)
+MIN_SEGMENT_SECONDS = 6
+MAX_SEGMENT_SECONDS = 10
+
+# Trechos abaixo deste nível (dB em relação ao pico) são considerados silêncio
+SILENCE_TOP_DB = 40
+
+# Pausas até esta duração ficam dentro do segmento; uma pausa maior sempre encerra o segmento
+MAX_GAP_SECONDS = 1.0
+
+# Formatos aceitos na entrada
+INPUT_EXTENSIONS = ('.wav', '.flac', '.ogg', '.opus', '.mp3', '.m4a')
+
+# Registro dos arquivos já processados, para retomar uma ingestão interrompida
+MANIFEST_NAME = '.ingest_manifest.json'
+
+
+# Hash do conteúdo do arquivo original (arquivos iguais são processados uma única vez)
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Decodifica qualquer formato suportado para float32 mono na taxa do Tortoise
+def load_mono(path):
+    import librosa
+    import soundfile as sf
+
+    try:
+        # WAV, FLAC e OGG/Opus (como no notebook, via soundfile)
+        data, sample_rate = sf.read(path, dtype='float32', always_2d=True)
+    except RuntimeError:
+        # MP3, M4A etc. (via pydub/ffmpeg)
+        from pydub import AudioSegment
+        segment = AudioSegment.from_file(path)
+        data = np.array(segment.get_array_of_samples(), dtype=np.float32).reshape(-1, segment.channels)
+        data /= float(1 << (8 * segment.sample_width - 1))
+        sample_rate = segment.frame_rate
+
+    audio = data.mean(axis=1)
+    if sample_rate != TARGET_SAMPLE_RATE:
+        audio = librosa.resample(audio, orig_sr=sample_rate, target_sr=TARGET_SAMPLE_RATE)
+    return audio
+
+
+# Corta um trecho de fala sem pausas mais longo que max_len: em partes iguais se todas tiverem ao
+# menos min_len, senão em janelas cheias (a sobra final pode se juntar ao trecho seguinte)
+def _split_interval(start, end, min_len, max_len):
+    count = -(-(end - start) // max_len)
+    if (end - start) // count >= min_len:
+        bounds = np.linspace(start, end, count + 1).astype(int)
+    else:
+        bounds = np.append(np.arange(start, end, max_len), end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# Divide o áudio em segmentos de 6 a 10 s cortando só nos silêncios: trechos de fala consecutivos
+# são agrupados inteiros, com as pausas curtas entre eles, enquanto o segmento couber em
+# max_seconds. Só um trecho de fala mais longo que max_seconds é cortado no meio. Os grupos são
+# escolhidos para aproveitar o máximo de áudio; só fica de fora a fala que não cabe em nenhum
+# segmento de min_seconds a max_seconds sem atravessar uma pausa longa.
+def split_segments(audio, min_seconds=MIN_SEGMENT_SECONDS, max_seconds=MAX_SEGMENT_SECONDS, top_db=SILENCE_TOP_DB,
+                   max_gap_seconds=MAX_GAP_SECONDS):
+    import librosa
+
+    min_len = int(min_seconds * TARGET_SAMPLE_RATE)
+    max_len = int(max_seconds * TARGET_SAMPLE_RATE)
+    max_gap = int(max_gap_seconds * TARGET_SAMPLE_RATE)
+
+    intervals = []
+    for start, end in librosa.effects.split(audio, top_db=top_db):
+        if end - start > max_len:
+            intervals.extend(_split_interval(start, end, min_len, max_len))
+        else:
+            intervals.append((start, end))
+
+    # Programação dinâmica sobre os trechos: best[i] é o maior total de áudio aproveitável a partir
+    # do trecho i, e next_cut[i] o trecho em que termina o segmento que começa em i (ou None se o
+    # trecho i fica de fora)
+    count = len(intervals)
+    best = [0] * (count + 1)
+    next_cut = [None] * (count + 1)
+    for i in range(count - 1, -1, -1):
+        best[i] = best[i + 1]
+        for j in range(i, count):
+            if j > i and intervals[j][0] - intervals[j - 1][1] > max_gap:
+                break
+            length = intervals[j][1] - intervals[i][0]
+            if length > max_len:
+                break
+            if length >= min_len and length + best[j + 1] > best[i]:
+                best[i], next_cut[i] = length + best[j + 1], j
+
+    segments = []
+    i = 0
+    while i < count:
+        if next_cut[i] is None:
+            i += 1
+            continue
+        segments.append(audio[intervals[i][0]:intervals[next_cut[i]][1]])
+        i = next_cut[i] + 1
+    return segments
+
+
+# Processa um arquivo (executado nos processos do pool) e devolve os caminhos gerados
+def process_file(source_path, digest, voice_dir):
+    import soundfile as sf
+
+    audio = load_mono(source_path)
+    peak = np.abs(audio).max() if audio.size else 0.0
+    if peak > 0:
+        # Normaliza o pico para -1 dBFS
+        audio = audio * (0.89 / peak)
+
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    outputs = []
+    for i, segment in enumerate(split_segments(audio)):
+        out_path = os.path.join(voice_dir, f'{stem}_{digest[:8]}_{i}.wav')
+        sf.write(out_path, segment, TARGET_SAMPLE_RATE, subtype='PCM_16')
+        outputs.append(out_path)
+    return outputs
+
+
+# Encontra os arquivos de entrada: cada subpasta de primeiro nível é um locutor
+def find_sources(input_dir, voice_name=None):
+    for root, _, files in os.walk(input_dir):
+        for f in sorted(files):
+            if not f.lower().endswith(INPUT_EXTENSIONS):
+                continue
+            path = os.path.join(root, f)
+            relative = os.path.relpath(path, input_dir).split(os.sep)
+            name = voice_name or (relative[0] if len(relative) > 1 else None)
+            if name is None:
+                logging.warning(f"Ignorando {path}: fora de uma pasta de locutor (use --name).")
+                continue
+            yield name, path
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def ingest(input_dir, output_dir, voice_name=None, num_workers=None):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+
+    pending = []
+    for name, path in find_sources(input_dir, voice_name):
+        digest = file_hash(path)
+        entry = manifest.get(digest)
+        if entry and all(os.path.exists(p) for p in entry['outputs']):
+            continue
+        voice_dir = os.path.join(output_dir, name)
+        os.makedirs(voice_dir, exist_ok=True)
+        pending.append((path, digest, voice_dir, name))
+
+    logging.info(f"{len(pending)} arquivo(s) para processar ({len(manifest)} já processado(s)).")
+    failures = 0
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        futures = {pool.submit(process_file, path, digest, voice_dir): (path, digest, name)
+                   for path, digest, voice_dir, name in pending}
+        for future in as_completed(futures):
+            path, digest, name = futures[future]
+            try:
+                outputs = future.result()
+            except Exception as e:
+                failures += 1
+                logging.error(f"Erro ao processar {path}: {e}")
+                continue
+            manifest[digest] = {'source': path, 'voice': name, 'outputs': outputs}
+            # O manifesto é salvo a cada arquivo, então uma interrupção perde no máximo o trabalho em andamento
+            save_manifest(output_dir, manifest)
+            logging.info(f"{path}: {len(outputs)} segmento(s) para a voz '{name}'.")
+    return len(pending) - failures, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Converte gravações (wav, mp3, opus...) em clipes de referência para o Tortoise: "
+                    "mono, 22,05 kHz, sem silêncio e em segmentos de 6 a 10 s.")
+    parser.add_argument('input_dir', help="Pasta com uma subpasta por locutor.")
+    parser.add_argument('--output-dir', default=os.path.join('voices_cloning_app', 'voices'),
+                        help="Pasta de vozes de saída (voices/<nome>/).")
+    parser.add_argument('--name', default=None, help="Nome único da voz para todos os arquivos da entrada.")
+    parser.add_argument('--workers', type=int, default=None, help="Processos em paralelo (padrão: núcleos).")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    done, failures = ingest(args.input_dir, args.output_dir, args.name, args.workers)
+    logging.info(f"Ingestão concluída: {done} arquivo(s) processado(s), {failures} com erro.")
+
+
+if __name__ == '__main__':
+    main()
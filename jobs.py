@@ -0,0 +1,801 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from functools import partial
+
+# Banco de dados local da fila de trabalhos
+JOBS_DB_PATH = os.path.join("cache", "jobs.sqlite3")
+
+# Diretório onde cada trabalho grava suas partes e o áudio completo
+JOBS_RESULTS_DIR = os.path.join("results", "jobs")
+
+# Estados possíveis de um trabalho
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# Tipos de trabalho: gerar áudio ou só preparar uma voz nova (calcular os latentes)
+JOB_SYNTHESIZE = 'synthesize'
+JOB_PREPARE_VOICE = 'prepare_voice'
+
+# Intervalo entre consultas à fila quando não há trabalho
+POLL_INTERVAL = 0.5
+
+# Manifesto de partes gravado com o resultado de cada trabalho (base das regerações incrementais)
+MANIFEST_NAME = 'manifest.json'
+
+# Sobreposição nas emendas entre partes reaproveitadas e partes regeneradas
+CROSSFADE_SECONDS = 0.02
+
+# Retenção dos trabalhos terminados (linha no banco e pasta em results/jobs): ficam os
+# JOBS_KEEP_PER_KEY mais recentes de cada voz, preset e semente (as bases possíveis de uma
+# regeração incremental) e nenhum com mais de JOBS_RETENTION_SECONDS. A limpeza roda no
+# supervisor a cada JOBS_PRUNE_INTERVAL.
+JOBS_KEEP_PER_KEY = 5
+JOBS_RETENTION_SECONDS = 30 * 24 * 3600
+JOBS_PRUNE_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    voice_name TEXT NOT NULL,
+    voice_dir TEXT NOT NULL,
+    text TEXT NOT NULL,
+    preset TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'synthesize',
+    incremental INTEGER NOT NULL DEFAULT 0,
+    candidates INTEGER,
+    latency_target REAL,
+    predicted_seconds REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    parts_total INTEGER,
+    parts_done INTEGER NOT NULL DEFAULT 0,
+    result_dir TEXT,
+    stats TEXT,
+    error TEXT,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL,
+    import_seconds REAL,
+    load_seconds REAL,
+    first_request_seconds REAL
+);
+-- Segundos por token de texto medidos para cada preset e número de candidatos (ver scheduler)
+CREATE TABLE IF NOT EXISTS preset_costs (
+    preset TEXT NOT NULL,
+    candidates INTEGER NOT NULL,
+    seconds_per_token REAL NOT NULL,
+    observations INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (preset, candidates)
+);
+"""
+
+# Colunas adicionadas depois da primeira versão do banco, na ordem em que surgiram
+_ADDED_COLUMNS = [
+    ('kind', f"TEXT NOT NULL DEFAULT '{JOB_SYNTHESIZE}'"),
+    ('incremental', "INTEGER NOT NULL DEFAULT 0"),
+    ('candidates', "INTEGER"),
+    ('latency_target', "REAL"),
+    ('predicted_seconds', "REAL"),
+    ('cancel_requested', "INTEGER NOT NULL DEFAULT 0"),
+]
+
+# Estados de um worker
+WORKER_LOADING = 'loading'
+WORKER_READY = 'ready'
+WORKER_FAILED = 'failed'
+
+# Um worker sem sinal de vida há mais tempo que isso é considerado morto
+WORKER_TIMEOUT = 30
+HEARTBEAT_INTERVAL = 5
+
+# Código de saída de um worker cujo modelo não carregou
+EXIT_LOAD_FAILED = 3
+
+# Reinício de workers que morrem: a espera dobra a cada falha seguida (até MAX_RESTART_BACKOFF) e,
+# depois de MAX_WORKER_RESTARTS falhas seguidas, o worker não é mais reiniciado. Um worker que
+# ficou de pé por WORKER_STABLE_SECONDS zera a contagem.
+RESTART_BACKOFF = 5
+MAX_RESTART_BACKOFF = 300
+MAX_WORKER_RESTARTS = 5
+WORKER_STABLE_SECONDS = 600
+
+
+# Bancos cujo esquema já foi criado ou atualizado neste processo (o esquema roda uma vez por
+# processo, não a cada conexão) e conexões reaproveitadas por thread
+_prepared_dbs = set()
+_prepare_lock = threading.Lock()
+_thread_connections = threading.local()
+
+
+# Cria as tabelas e adiciona as colunas que faltam. WAL fica gravado no arquivo do banco.
+def _prepare_db(conn):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    # Bancos criados por versões anteriores não têm as colunas mais novas
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for column, definition in _ADDED_COLUMNS:
+        if column not in columns:
+            try:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+            except sqlite3.OperationalError:
+                # Outro processo acabou de adicionar a coluna
+                pass
+
+
+# Abre (e cria, se preciso) o banco da fila. WAL permite leituras da UI durante escritas dos workers.
+def connect(db_path=JOBS_DB_PATH):
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    key = os.path.abspath(db_path)
+    exists = os.path.exists(db_path)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    with _prepare_lock:
+        if not exists or key not in _prepared_dbs:
+            _prepare_db(conn)
+            _prepared_dbs.add(key)
+    return conn
+
+
+# Conexão da thread atual, aberta uma vez e reaproveitada pelas consultas curtas e frequentes
+# (estado dos trabalhos consultado pela UI e pela API, progresso, fila)
+def shared_connection(db_path=JOBS_DB_PATH):
+    connections = _thread_connections.__dict__.setdefault('by_path', {})
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = connect(db_path)
+    return conn
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job['stats'] = json.loads(job['stats']) if job['stats'] else None
+    return job
+
+
+# Coloca um novo trabalho na fila e devolve o id dele
+# Com incremental=True, o worker compara o texto com a última geração da mesma voz, preset e
+# semente e só gera as partes inseridas ou alteradas. candidates troca o número de candidatos
+# do preset; latency_target e predicted_seconds vêm do escalonador (scheduler).
+def submit_job(voice_name, voice_dir, text, preset="fast", seed=None, db_path=JOBS_DB_PATH, kind=JOB_SYNTHESIZE,
+               incremental=False, candidates=None, latency_target=None, predicted_seconds=None):
+    job_id = uuid.uuid4().hex
+    seed = int(time.time()) if seed is None else seed
+    conn = shared_connection(db_path)
+    conn.execute(
+        "INSERT INTO jobs (id, status, voice_name, voice_dir, text, preset, seed, kind, incremental, candidates, "
+        "latency_target, predicted_seconds, result_dir, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (job_id, STATUS_QUEUED, voice_name, voice_dir, text, preset, seed, kind, int(incremental), candidates,
+         latency_target, predicted_seconds, os.path.join(JOBS_RESULTS_DIR, job_id), time.time())
+    )
+    logging.info(f"Trabalho {job_id} ({kind}) enfileirado para a voz '{voice_name}'.")
+    return job_id
+
+
+# Enfileira o cálculo dos latentes de uma voz recém-enviada, para a primeira geração já os encontrar no cache
+def submit_voice_preparation(voice_name, voice_dir, db_path=JOBS_DB_PATH):
+    return submit_job(voice_name, voice_dir, '', preset='', seed=0, db_path=db_path, kind=JOB_PREPARE_VOICE)
+
+
+def get_job(job_id, db_path=JOBS_DB_PATH):
+    conn = shared_connection(db_path)
+    return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+# Quantidade de trabalhos ainda na fila (usado pela UI para mostrar a posição)
+def count_queued(db_path=JOBS_DB_PATH):
+    conn = shared_connection(db_path)
+    return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (STATUS_QUEUED,)).fetchone()[0]
+
+
+# Pega o trabalho mais antigo da fila de forma atômica entre processos
+def claim_next_job(conn, worker_name):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (STATUS_QUEUED,)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker = ?, started_at = ? WHERE id = ?",
+            (STATUS_RUNNING, worker_name, time.time(), row['id'])
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone())
+
+
+def update_progress(conn, job_id, parts_done, parts_total):
+    conn.execute("UPDATE jobs SET parts_done = ?, parts_total = ? WHERE id = ?", (parts_done, parts_total, job_id))
+
+
+# Avança o progresso a partir da thread de escrita do AudioSink (com a própria conexão, já que
+# a do worker pertence à thread dele); o progresso nunca volta
+def advance_progress(job_id, parts_done, db_path=JOBS_DB_PATH):
+    conn = shared_connection(db_path)
+    conn.execute("UPDATE jobs SET parts_done = MAX(parts_done, ?) WHERE id = ?", (parts_done, job_id))
+
+
+# Caminho do arquivo do banco de uma conexão aberta
+def _db_path(conn):
+    return conn.execute("PRAGMA database_list").fetchone()['file']
+
+
+def finish_job(conn, job_id, stats):
+    # Todas as partes já estão em disco, mesmo que o aviso da última gravação ainda não tenha chegado
+    conn.execute(
+        "UPDATE jobs SET status = ?, stats = ?, finished_at = ?, parts_done = COALESCE(parts_total, parts_done) "
+        "WHERE id = ?",
+        (STATUS_DONE, json.dumps(stats), time.time(), job_id)
+    )
+
+
+def fail_job(conn, job_id, error):
+    conn.execute(
+        "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+        (STATUS_FAILED, error, time.time(), job_id)
+    )
+
+
+# Cancela um trabalho (usado quando quem pediu desiste ou o prazo acaba). Na fila, ele falha na
+# hora; em andamento, o worker vê o pedido de cancelamento entre uma parte e outra e para.
+# Devolve False se o trabalho já tinha terminado.
+def cancel_job(job_id, reason, db_path=JOBS_DB_PATH):
+    conn = shared_connection(db_path)
+    cursor = conn.execute(
+        "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND status = ?",
+        (STATUS_FAILED, reason, time.time(), job_id, STATUS_QUEUED)
+    )
+    if cursor.rowcount:
+        return True
+    cursor = conn.execute(
+        "UPDATE jobs SET cancel_requested = 1, error = ? WHERE id = ? AND status = ?",
+        (reason, job_id, STATUS_RUNNING)
+    )
+    return cursor.rowcount > 0
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# Interrompe o trabalho em andamento se alguém pediu o cancelamento
+def check_cancelled(conn, job_id):
+    row = conn.execute("SELECT cancel_requested, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is not None and row['cancel_requested']:
+        raise JobCancelled(row['error'] or "Trabalho cancelado.")
+
+
+# Atualiza o estado do worker e os tempos de carga do modelo (sinal de vida)
+def report_worker(conn, worker_name, started_at, status, model_status):
+    conn.execute(
+        "INSERT OR REPLACE INTO workers (name, status, started_at, heartbeat_at, import_seconds, load_seconds, "
+        "first_request_seconds) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (worker_name, status, started_at, time.time(), model_status['import_seconds'],
+         model_status['load_seconds'], model_status['first_request_seconds'])
+    )
+
+
+# Workers vivos (com sinal de vida recente), usados pela UI como indicador de prontidão
+def list_workers(db_path=JOBS_DB_PATH):
+    conn = shared_connection(db_path)
+    rows = conn.execute(
+        "SELECT * FROM workers WHERE heartbeat_at > ? ORDER BY started_at", (time.time() - WORKER_TIMEOUT,)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+# Trabalhos que ficaram "running" de um pool anterior que morreu voltam para a fila
+def requeue_stale_jobs(db_path=JOBS_DB_PATH):
+    conn = connect(db_path)
+    try:
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, worker = NULL, started_at = NULL, parts_done = 0 WHERE status = ?",
+            (STATUS_QUEUED, STATUS_RUNNING)
+        )
+        if cursor.rowcount:
+            logging.info(f"{cursor.rowcount} trabalho(s) interrompido(s) voltaram para a fila.")
+    finally:
+        conn.close()
+
+
+# Nome de um processo worker na tabela de workers e na coluna worker dos trabalhos
+def worker_name_for(pid):
+    return f"{os.uname().nodename}:{pid}"
+
+
+# Trabalhos em andamento de um worker que morreu (falta de memória, segfault...) falham na hora:
+# sem isso a UI e a API esperariam para sempre por um fim que nunca chega. Não voltam para a
+# fila porque o mesmo pedido poderia derrubar o próximo worker.
+def fail_worker_jobs(worker_name, error, db_path=JOBS_DB_PATH):
+    conn = connect(db_path)
+    try:
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status = ? AND worker = ?",
+            (STATUS_FAILED, error, time.time(), STATUS_RUNNING, worker_name)
+        )
+        if cursor.rowcount:
+            logging.warning(f"{cursor.rowcount} trabalho(s) do worker {worker_name} falharam: {error}")
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+# Falha os trabalhos em andamento cujo worker não dá sinal de vida há mais de WORKER_TIMEOUT
+# (processo travado ou morto em outro pool, que o supervisor local não vê)
+def reap_stale_jobs(db_path=JOBS_DB_PATH, now=None):
+    now = time.time() if now is None else now
+    conn = connect(db_path)
+    try:
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status = ? AND worker NOT IN "
+            "(SELECT name FROM workers WHERE heartbeat_at > ?)",
+            (STATUS_FAILED, "O worker parou de responder.", now, STATUS_RUNNING, now - WORKER_TIMEOUT)
+        )
+        if cursor.rowcount:
+            logging.warning(f"{cursor.rowcount} trabalho(s) de workers sem sinal de vida falharam.")
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+# Apaga os trabalhos terminados que saíram da retenção, com as suas pastas de resultado
+def prune_jobs(db_path=JOBS_DB_PATH, keep=JOBS_KEEP_PER_KEY, max_age=JOBS_RETENTION_SECONDS, now=None):
+    now = time.time() if now is None else now
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT id, result_dir FROM ("
+            " SELECT id, result_dir, finished_at, ROW_NUMBER() OVER ("
+            "  PARTITION BY kind, status, voice_name, preset, seed ORDER BY finished_at DESC) AS position"
+            " FROM jobs WHERE status IN (?, ?)"
+            ") WHERE position > ? OR finished_at < ?",
+            (STATUS_DONE, STATUS_FAILED, keep, now - max_age)
+        ).fetchall()
+        for row in rows:
+            # A linha sai primeiro: sem ela nenhum trabalho novo escolhe esta pasta como base
+            conn.execute("DELETE FROM jobs WHERE id = ?", (row['id'],))
+            if row['result_dir']:
+                shutil.rmtree(row['result_dir'], ignore_errors=True)
+        if rows:
+            logging.info(f"{len(rows)} trabalho(s) antigo(s) removido(s).")
+        return len(rows)
+    finally:
+        conn.close()
+
+
+def write_manifest(result_dir, manifest):
+    path = os.path.join(result_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_manifest(result_dir):
+    try:
+        with open(os.path.join(result_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# Última geração concluída com a mesma voz (mesmo conteúdo), preset, candidatos e semente, e com o
+# mesmo modo de geração (variante de longform.generation_variant e lote autorregressivo), cujas
+# partes ainda estão em disco; devolve (trabalho, manifesto) ou None. Manifestos sem a variante
+# (anteriores a ela) não são reaproveitados.
+def find_base_job(conn, job, voice_hash, variant=None, batch_size=1):
+    rows = conn.execute(
+        "SELECT * FROM jobs WHERE kind = ? AND status = ? AND voice_name = ? AND preset = ? AND candidates IS ? "
+        "AND seed = ? AND id != ? ORDER BY finished_at DESC LIMIT 5",
+        (JOB_SYNTHESIZE, STATUS_DONE, job['voice_name'], job['preset'], job['candidates'], job['seed'], job['id'])
+    ).fetchall()
+    for row in rows:
+        manifest = load_manifest(row['result_dir'])
+        if manifest is None or manifest['voice_hash'] != voice_hash:
+            continue
+        if 'variant' not in manifest or (manifest['variant'], manifest.get('batch_size')) != (variant, batch_size):
+            continue
+        if all(os.path.exists(os.path.join(row['result_dir'], f'{j}.wav')) for j in range(len(manifest['texts']))):
+            return _row_to_job(row), manifest
+    return None
+
+
+# Calcula (ou confirma no cache em disco) os latentes de condicionamento de uma voz
+def prepare_voice(tts, job, pool=None):
+    from voice_cache import get_conditioning_latents
+
+    started = time.perf_counter()
+    if pool is not None:
+        pool.conditioning_latents(job['voice_name'], job['voice_dir'])
+    else:
+        get_conditioning_latents(tts, job['voice_name'], job['voice_dir'])
+    return {'latents_seconds': time.perf_counter() - started}
+
+
+# Executa um trabalho de ponta a ponta: partes e áudio completo vão para job['result_dir']
+# Com um ChunkPool (pool), as partes são distribuídas entre os processos do pool em vez de
+# geradas pelo modelo local (tts)
+def run_job(tts, job, conn, cache=None, pool=None, adaptive=None, batch_size=None, storage='float32'):
+    from profiling import Profiler
+
+    # Tempo e memória de cada etapa vão para results/profile/events.jsonl e para as estatísticas
+    profiler = Profiler(job['id'])
+    with profiler.activate():
+        stats = _run_job_stages(tts, job, conn, cache, pool, adaptive, batch_size, storage)
+    stats['profile'] = profiler.summary()
+    # Pico de memória durante a geração deste trabalho (como no benchmark), não o do processo
+    # desde que ele subiu; None quando todas as partes foram reaproveitadas
+    stats['peak_rss_bytes'] = stats['profile']['stages'].get('chunk', {}).get('peak_rss_bytes')
+    return stats
+
+
+def _run_job_stages(tts, job, conn, cache, pool=None, adaptive=None, batch_size=None, storage='float32'):
+    from audio_sink import SAMPLE_RATE, AudioSink, read_wav
+    from longform import (LongformAssembler, estimate_samples, generation_variant, iter_longform,
+                          resolve_batch_size, split_text, split_text_incremental)
+    from voice_cache import get_conditioning_latents, voice_content_hash
+
+    voice_hash = voice_content_hash(job['voice_dir'])
+    # Partes geradas com outra precisão, amostragem ou lote não são o mesmo áudio: não se misturam
+    precision = pool.precision if pool is not None else getattr(tts, 'inference_precision', 'fp32')
+    variant = generation_variant(precision, adaptive, job['candidates'])
+    batch_size = resolve_batch_size(batch_size, job['preset'], adaptive, job['candidates'])
+    base = find_base_job(conn, job, voice_hash, variant, batch_size) if job['incremental'] else None
+    # O plano de partes é equilibrado para o número de processos que vão gerá-las
+    workers = pool.processes if pool is not None else 1
+    if base is not None:
+        base_job, base_manifest = base
+        texts, reused = split_text_incremental(job['text'], base_manifest['texts'], workers)
+    else:
+        texts = split_text(job['text'], workers)
+        reused = [None] * len(texts)
+    update_progress(conn, job['id'], 0, len(texts))
+
+    if pool is not None:
+        conditioning_latents = pool.conditioning_latents(job['voice_name'], job['voice_dir'])
+    else:
+        conditioning_latents = get_conditioning_latents(tts, job['voice_name'], job['voice_dir'])
+    sink = AudioSink(persist_dir=job['result_dir'])
+    assembler = LongformAssembler(estimate_samples(texts), storage)
+    cache_before = cache.stats() if cache is not None else None
+    if adaptive is not None:
+        # O histórico de candidatos é por trabalho
+        adaptive.history.clear()
+    started = time.perf_counter()
+    first_part_seconds = None
+
+    # Só as partes novas ou alteradas passam pelo modelo
+    missing = [texts[j] for j in range(len(texts)) if reused[j] is None]
+    if pool is not None:
+        parts = pool.iter_longform(missing, conditioning_latents, preset=job['preset'], k=1, seed=job['seed'],
+                                   batch_size=batch_size, cache=cache, voice_hash=voice_hash, adaptive=adaptive,
+                                   num_candidates=job['candidates'])
+    else:
+        parts = iter_longform(tts, missing, conditioning_latents, preset=job['preset'], k=1, seed=job['seed'],
+                              batch_size=batch_size, cache=cache, voice_hash=voice_hash, adaptive=adaptive,
+                              num_candidates=job['candidates'])
+    crossfade = int(CROSSFADE_SECONDS * SAMPLE_RATE)
+    db_path = _db_path(conn)
+    # Cancelado ou com erro, as partes que ainda não começaram no pool não são geradas
+    try:
+        for j in range(len(texts)):
+            check_cancelled(conn, job['id'])
+            # A UI lê as partes do disco, então o progresso só avança quando a gravação termina; a
+            # geração não espera o disco e já segue para a próxima parte
+            on_written = partial(advance_progress, job['id'], j + 1, db_path)
+            if reused[j] is not None:
+                # Parte igual à da geração anterior: o arquivo é reaproveitado sem regerar nem recodificar
+                source_path = os.path.join(base_job['result_dir'], f'{reused[j]}.wav')
+                gen = read_wav(source_path)
+                sink.reuse(j, source_path, on_written)
+            else:
+                _, gen = next(parts)
+                sink.write(j, gen, on_written)
+            if first_part_seconds is None:
+                first_part_seconds = time.perf_counter() - started
+            # Emendas que não existiam na geração anterior ganham uma sobreposição curta
+            seam = base is not None and j > 0 and (
+                reused[j] is None or reused[j - 1] is None or reused[j] != reused[j - 1] + 1)
+            assembler.append(gen, crossfade=crossfade if seam else 0)
+    finally:
+        parts.close()
+
+    sink.write('combined', assembler.result())
+    write_manifest(job['result_dir'], {
+        'voice_name': job['voice_name'],
+        'voice_hash': voice_hash,
+        'preset': job['preset'],
+        'seed': job['seed'],
+        'variant': variant,
+        'batch_size': batch_size,
+        'texts': texts,
+    })
+    sink.wait()
+
+    stats = assembler.stats()
+    if base is not None:
+        stats['incremental'] = {
+            'base_job': base_job['id'],
+            'parts_reused': len(texts) - len(missing),
+            'parts_synthesized': len(missing),
+        }
+    if adaptive is not None:
+        # Candidatos realmente gerados em cada parte sintetizada (as lidas do cache não aparecem)
+        stats['sampling'] = {
+            'candidates': sum(r['candidates'] for r in adaptive.history),
+            'budget': sum(r['budget'] for r in adaptive.history),
+            'parts': list(adaptive.history),
+        }
+    stats['first_part_seconds'] = first_part_seconds
+    stats['total_seconds'] = time.perf_counter() - started
+    if cache is not None:
+        cache_after = cache.stats()
+        stats['cache'] = {
+            'hits': cache_after['hits'] - cache_before['hits'],
+            'misses': cache_after['misses'] - cache_before['misses'],
+            'size_bytes': cache_after['size_bytes'],
+        }
+    return stats
+
+
+# Carrega o modelo de um worker (chamado na thread de aquecimento do LazyTTS)
+def load_worker_tts(num_threads=None, mmap_weights=False, precision='fp32'):
+    import torch
+
+    from quantization import create_tts
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    # Com os pesos mapeados em memória, todos os processos compartilham as mesmas páginas
+    return create_tts(precision, mmap_weights)
+
+
+# Thread de sinal de vida: publica o estado do worker e os tempos do modelo periodicamente,
+# inclusive durante trabalhos longos
+def _heartbeat_loop(db_path, worker_name, started_at, handle, state):
+    conn = connect(db_path)
+    while True:
+        report_worker(conn, worker_name, started_at, state['status'], handle.status())
+        time.sleep(HEARTBEAT_INTERVAL)
+
+
+# Laço de um processo worker: o modelo é carregado uma única vez, em segundo plano, e o
+# worker só pega trabalhos da fila depois que ele está pronto. Com fanout > 1 o worker não
+# carrega o modelo: cada trabalho é dividido entre `fanout` processos, cada um com o seu.
+def worker_loop(db_path=JOBS_DB_PATH, num_threads=None, metrics_port=None, fanout=1, mmap_weights=False,
+                precision='fp32', adaptive=None, ar_batch=None, storage='float32'):
+    logging.basicConfig(level=logging.INFO)
+    from lazy_tts import LazyTTS
+    from profiling import install_trace_signal, instrument_tts, start_metrics_server
+    from result_cache import ResultCache
+    from scheduler import record_job_cost
+
+    # `kill -USR1 <pid>` grava um trace cProfile do próximo trabalho
+    install_trace_signal()
+    if metrics_port:
+        start_metrics_server(metrics_port)
+
+    worker_name = worker_name_for(os.getpid())
+    started_at = time.time()
+    if fanout > 1:
+        from fanout import load_chunk_pool
+        from quantization import create_tts
+
+        handle = LazyTTS(loader=load_chunk_pool, processes=fanout, num_threads=num_threads,
+                         model_loader=partial(create_tts, precision, mmap_weights), precision=precision).warm_up()
+    else:
+        handle = LazyTTS(loader=load_worker_tts, num_threads=num_threads, mmap_weights=mmap_weights,
+                         precision=precision).warm_up()
+    state = {'status': WORKER_LOADING}
+    threading.Thread(target=_heartbeat_loop, args=(db_path, worker_name, started_at, handle, state),
+                     name='worker-heartbeat', daemon=True).start()
+
+    handle.wait()
+    if handle.failed:
+        state['status'] = WORKER_FAILED
+        report_worker(connect(db_path), worker_name, started_at, WORKER_FAILED, handle.status())
+        # Sem modelo não há o que fazer; o código de saída diz ao supervisor para esperar antes de reiniciar
+        try:
+            handle.get()
+        except RuntimeError as e:
+            logging.error(f"Worker {worker_name} encerrado: {e}")
+        sys.exit(EXIT_LOAD_FAILED)
+    if fanout > 1:
+        tts, pool = None, handle.get()
+    else:
+        tts, pool = instrument_tts(handle.get()), None
+    state['status'] = WORKER_READY
+    cache = ResultCache()
+    conn = connect(db_path)
+    logging.info(f"Worker {worker_name} pronto em {time.time() - started_at:.1f}s.")
+
+    while True:
+        job = claim_next_job(conn, worker_name)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        logging.info(f"Worker {worker_name} iniciou o trabalho {job['id']}.")
+        try:
+            if job['kind'] == JOB_PREPARE_VOICE:
+                stats = prepare_voice(tts, job, pool)
+            else:
+                stats = run_job(tts, job, conn, cache, pool, adaptive, ar_batch, storage)
+        except JobCancelled as e:
+            logging.info(f"Trabalho {job['id']} cancelado: {e}")
+            fail_job(conn, job['id'], str(e))
+        except Exception as e:
+            logging.error(f"Erro no trabalho {job['id']}: {e}")
+            fail_job(conn, job['id'], str(e))
+        else:
+            if job['kind'] == JOB_SYNTHESIZE:
+                try:
+                    # Tempo previsto x real; o custo medido recalibra o escalonador de presets
+                    stats['schedule'] = record_job_cost(conn, job, stats, precision, adaptive)
+                except Exception as e:
+                    logging.warning(f"Custo do trabalho {job['id']} não registrado: {e}")
+            finish_job(conn, job['id'], stats)
+            if job['kind'] == JOB_SYNTHESIZE:
+                handle.record_first_request(stats['total_seconds'])
+            logging.info(f"Trabalho {job['id']} concluído: {stats}")
+            logging.info(f"Cache de resultados do worker {worker_name}: {cache.stats()}")
+
+
+# Inicia um processo worker ('spawn' evita herdar estado do torch do processo pai)
+def _spawn_worker(db_path, num_threads, metrics_port=None, fanout=1, mmap_weights=False, precision='fp32',
+                  adaptive=None, ar_batch=None, storage='float32'):
+    process = multiprocessing.get_context('spawn').Process(
+        target=worker_loop,
+        args=(db_path, num_threads, metrics_port, fanout, mmap_weights, precision, adaptive, ar_batch, storage))
+    process.start()
+    return process
+
+
+# Porta de métricas do i-ésimo worker (cada processo expõe as suas)
+def _worker_metrics_port(metrics_port, index):
+    return metrics_port + index if metrics_port else None
+
+
+# Inicia o pool de workers. Cada processo que gera áudio recebe uma fatia igual dos núcleos.
+def start_workers(num_workers, db_path=JOBS_DB_PATH, num_threads=None, metrics_port=None, fanout=1,
+                  mmap_weights=False, precision='fp32', adaptive=None, ar_batch=None, storage='float32'):
+    requeue_stale_jobs(db_path)
+    if num_threads is None:
+        num_threads = max(1, (os.cpu_count() or 1) // (num_workers * fanout))
+    if mmap_weights:
+        # Converte os checkpoints uma vez, antes dos workers, para eles não competirem pela conversão
+        from shared_weights import MMAP_SUPPORTED, convert_checkpoints
+        if MMAP_SUPPORTED:
+            convert_checkpoints()
+    return [_spawn_worker(db_path, num_threads, _worker_metrics_port(metrics_port, i), fanout, mmap_weights,
+                          precision, adaptive, ar_batch, storage)
+            for i in range(num_workers)]
+
+
+# Valor de --ar-batch: 'auto' (maior divisor do número de candidatos até o limite) ou um lote fixo
+def parse_ar_batch(value):
+    if value == 'auto':
+        return value
+    try:
+        batch_size = int(value)
+    except ValueError:
+        batch_size = 0
+    if batch_size < 1:
+        raise argparse.ArgumentTypeError(f"lote inválido: {value!r} (use 'auto' ou um inteiro >= 1)")
+    return batch_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pool de workers da fila de geração de áudio.")
+    parser.add_argument('--workers', type=int, default=1, help="Número de processos worker.")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Threads do torch por processo de geração (padrão: núcleos / (workers * fanout)).")
+    parser.add_argument('--fanout', type=int, default=1,
+                        help="Processos que dividem as partes de cada trabalho (cada um com o próprio modelo).")
+    parser.add_argument('--mmap-weights', action='store_true',
+                        help="Mapeia os pesos do modelo em memória, compartilhando-os entre os processos.")
+    parser.add_argument('--precision', choices=['fp32', 'int8', 'bf16'], default='fp32',
+                        help="Modo de inferência: fp32, int8 (quantização dinâmica) ou bf16 (autocast).")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Amostragem adaptativa: para de gerar candidatos quando o escore CLVP se estabiliza.")
+    parser.add_argument('--adaptive-threshold', type=float, default=None,
+                        help="Escore CLVP que encerra a amostragem adaptativa na hora (padrão: só estabilização).")
+    parser.add_argument('--ar-batch', type=parse_ar_batch, default=None,
+                        help="Candidatos autorregressivos por passada: 1 (padrão, igual ao app), 'auto' ou N. "
+                             "Lotes > 1 são determinísticos, mas não idênticos ao lote 1.")
+    parser.add_argument('--storage', choices=['float32', 'float16', 'int16'], default='float32',
+                        help="Tipo do buffer do áudio completo: float16 e int16 usam metade da memória.")
+    parser.add_argument('--db', default=JOBS_DB_PATH, help="Caminho do banco SQLite da fila.")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Porta inicial das métricas Prometheus (um worker por porta, em sequência).")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    num_threads = args.threads or max(1, (os.cpu_count() or 1) // (args.workers * args.fanout))
+    adaptive = None
+    if args.adaptive or args.adaptive_threshold is not None:
+        from adaptive_sampling import AdaptiveSampling
+        adaptive = AdaptiveSampling(score_threshold=args.adaptive_threshold)
+    workers = start_workers(args.workers, args.db, num_threads, args.metrics_port, args.fanout, args.mmap_weights,
+                            args.precision, adaptive, args.ar_batch, args.storage)
+    logging.info(f"{len(workers)} worker(s) iniciado(s) com {num_threads} thread(s) cada.")
+    spawn = partial(_spawn_worker, args.db, num_threads, fanout=args.fanout, mmap_weights=args.mmap_weights,
+                    precision=args.precision, adaptive=adaptive, ar_batch=args.ar_batch, storage=args.storage)
+    started = [time.time()] * len(workers)
+    failures = [0] * len(workers)
+    restart_at = [None] * len(workers)
+    reaped_at = 0.0
+    pruned_at = 0.0
+    try:
+        # Workers que morrerem são substituídos (com espera crescente se morrerem seguidamente) e o
+        # trabalho que estava com eles falha; trabalhos de workers sem sinal de vida também falham
+        while True:
+            time.sleep(1)
+            now = time.time()
+            if now - reaped_at >= HEARTBEAT_INTERVAL:
+                reap_stale_jobs(args.db, now)
+                reaped_at = now
+            if now - pruned_at >= JOBS_PRUNE_INTERVAL:
+                prune_jobs(args.db, now=now)
+                pruned_at = now
+            for i, process in enumerate(workers):
+                if process is None:
+                    if restart_at[i] is not None and now >= restart_at[i]:
+                        workers[i] = spawn(metrics_port=_worker_metrics_port(args.metrics_port, i))
+                        started[i], restart_at[i] = now, None
+                    continue
+                if process.is_alive():
+                    continue
+                workers[i] = None
+                if now - started[i] >= WORKER_STABLE_SECONDS:
+                    failures[i] = 0
+                failures[i] += 1
+                reason = ("o modelo não carregou" if process.exitcode == EXIT_LOAD_FAILED
+                          else f"código {process.exitcode}")
+                fail_worker_jobs(worker_name_for(process.pid), f"O worker terminou durante o trabalho ({reason}).",
+                                 args.db)
+                if failures[i] > MAX_WORKER_RESTARTS:
+                    logging.error(f"Worker {process.pid} terminou ({reason}) após {MAX_WORKER_RESTARTS} "
+                                  f"reinícios seguidos; não será reiniciado.")
+                    continue
+                delay = min(MAX_RESTART_BACKOFF, RESTART_BACKOFF * 2 ** (failures[i] - 1))
+                logging.warning(f"Worker {process.pid} terminou ({reason}); reiniciando em {delay}s.")
+                restart_at[i] = now + delay
+            if all(process is None and at is None for process, at in zip(workers, restart_at)):
+                logging.error("Nenhum worker ativo; encerrando o pool.")
+                sys.exit(1)
+    except KeyboardInterrupt:
+        for process in workers:
+            if process is not None:
+                process.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import importlib
+import logging
+import threading
+import time
+
+
+# Construtor padrão do modelo (o import do Tortoise só acontece aqui)
+def load_text_to_speech(**tts_kwargs):
+    from tortoise.api import TextToSpeech
+    return TextToSpeech(**tts_kwargs)
+
+
+# Referência preguiçosa para o TextToSpeech: nada pesado é importado ou carregado na criação.
+# O modelo é carregado no primeiro get() ou antes, em uma thread de aquecimento (warm_up()).
+# Os tempos de import, de carga dos pesos e da primeira geração são medidos separadamente.
+class LazyTTS:
+    def __init__(self, loader=load_text_to_speech, **tts_kwargs):
+        self.loader = loader
+        self.tts_kwargs = tts_kwargs
+        self.created_at = time.time()
+        self.import_seconds = None
+        self.load_seconds = None
+        self.first_request_seconds = None
+        self._tts = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._loaded.is_set() and self._error is None
+
+    @property
+    def failed(self):
+        return self._error is not None
+
+    def _load(self):
+        with self._lock:
+            if self._loaded.is_set():
+                return
+            try:
+                start = time.perf_counter()
+                importlib.import_module('torch')
+                importlib.import_module('tortoise.api')
+                self.import_seconds = time.perf_counter() - start
+
+                start = time.perf_counter()
+                self._tts = self.loader(**self.tts_kwargs)
+                self.load_seconds = time.perf_counter() - start
+                logging.info(f"Modelo carregado (import: {self.import_seconds:.1f}s, pesos: {self.load_seconds:.1f}s).")
+            except Exception as e:
+                logging.error(f"Falha ao carregar o modelo: {e}")
+                self._error = e
+            finally:
+                self._loaded.set()
+
+    # Começa a carregar o modelo em segundo plano, sem bloquear quem chamou
+    def warm_up(self):
+        if self._thread is None and not self._loaded.is_set():
+            self._thread = threading.Thread(target=self._load, name='tts-warm-up', daemon=True)
+            self._thread.start()
+        return self
+
+    # Espera o fim do carregamento (com ou sem sucesso); devolve False se o tempo acabar
+    def wait(self, timeout=None):
+        return self._loaded.wait(timeout)
+
+    # Devolve o modelo, carregando (ou esperando o aquecimento) se ainda não estiver pronto
+    def get(self):
+        if not self._loaded.is_set():
+            if self._thread is not None:
+                self._loaded.wait()
+            else:
+                self._load()
+        if self._error is not None:
+            raise RuntimeError(f"Modelo indisponível: {self._error}") from self._error
+        return self._tts
+
+    # Registra a latência da primeira geração (só a primeira chamada conta)
+    def record_first_request(self, seconds):
+        if self.first_request_seconds is None:
+            self.first_request_seconds = seconds
+            logging.info(f"Primeira geração concluída em {seconds:.1f}s.")
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'failed': self.failed,
+            'import_seconds': self.import_seconds,
+            'load_seconds': self.load_seconds,
+            'first_request_seconds': self.first_request_seconds,
+        }
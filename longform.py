@@ -0,0 +1,224 @@
+from contextlib import contextmanager, nullcontext
+from difflib import SequenceMatcher
+
+import numpy as np
+import torch
+
+from audio_sink import SAMPLE_RATE
+from chunker import plan_chunks, plan_incremental
+from profiling import stage
+from result_cache import chunk_key
+
+# Quantidade de candidatos autorregressivos gerados por cada preset do Tortoise
+PRESET_AUTOREGRESSIVE_SAMPLES = {
+    'ultra_fast': 16,
+    'fast': 96,
+    'standard': 256,
+    'high_quality': 256,
+}
+
+# Maior lote de candidatos usado por padrão (o Tortoise usa 1 quando não há GPU)
+MAX_AUTOREGRESSIVE_BATCH = 16
+
+# Estimativa de fala para pré-alocar a saída (cerca de 14 caracteres por segundo)
+SAMPLES_PER_CHAR = SAMPLE_RATE // 14
+
+# Tipos aceitos para armazenar o áudio completo e a escala aplicada às amostras
+STORAGE_DTYPES = {
+    'float32': (np.float32, 1.0),
+    'float16': (np.float16, 1.0),
+    'int16': (np.int16, 32767.0),
+}
+
+
+# Função para dividir o texto em partes: '|' indica cortes manuais, senão o planejador
+# equilibra as partes para `workers` processos ou lotes em paralelo
+def split_text(text_input, workers=1):
+    with stage('text_split'):
+        if '|' in text_input:
+            return text_input.split('|')
+        return list(plan_chunks(text_input, workers))
+
+
+# Divide um texto editado reaproveitando as partes de uma geração anterior (previous_texts).
+# Devolve as partes e, para cada uma, o índice da parte anterior idêntica (ou None se é nova).
+def split_text_incremental(text_input, previous_texts, workers=1):
+    with stage('text_split'):
+        if '|' not in text_input:
+            return plan_incremental(previous_texts, text_input, workers)
+        # Cortes manuais: as partes são comparadas diretamente
+        texts = text_input.split('|')
+        reused = [None] * len(texts)
+        matcher = SequenceMatcher(a=previous_texts, b=texts, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                reused[j1:j2] = range(i1, i2)
+        return texts, reused
+
+
+# Maior divisor do número de candidatos que não passa do limite, para não descartar amostras
+def pick_autoregressive_batch(preset, max_batch_size=MAX_AUTOREGRESSIVE_BATCH, num_candidates=None):
+    num_samples = num_candidates or PRESET_AUTOREGRESSIVE_SAMPLES[preset]
+    for batch_size in range(min(max_batch_size, num_samples), 0, -1):
+        if num_samples % batch_size == 0:
+            return batch_size
+    return 1
+
+
+# Lote autorregressivo efetivo. O padrão (None) é 1, o mesmo do laço original, para que o
+# áudio seja idêntico amostra a amostra; 'auto' escolhe o maior lote que divide os candidatos
+# (mais rápido, mas com outro áudio para a mesma semente). A amostragem adaptativa usa o lote dela.
+def resolve_batch_size(batch_size, preset, adaptive=None, num_candidates=None):
+    if adaptive is not None and batch_size is None:
+        return adaptive.batch_size
+    if batch_size == 'auto':
+        return pick_autoregressive_batch(preset, num_candidates=num_candidates)
+    return batch_size or 1
+
+
+# Troca temporariamente o tamanho do lote autorregressivo da instância do Tortoise
+@contextmanager
+def autoregressive_batch(tts, batch_size):
+    previous = tts.autoregressive_batch_size
+    tts.autoregressive_batch_size = batch_size
+    try:
+        yield
+    finally:
+        tts.autoregressive_batch_size = previous
+
+
+# Gera o áudio de uma única parte do texto. Cada chamada reinicia a semente, então o
+# resultado de uma parte depende apenas de (texto, latentes, preset, k, semente, lote).
+# num_candidates troca o número de candidatos do preset (ver scheduler). Com uma AdaptiveSampling
+# (adaptive_sampling), o orçamento de candidatos acompanha o tamanho da parte e a geração de
+# candidatos para assim que o escore CLVP é bom o bastante.
+def synthesize_part(tts, text_part, conditioning_latents, preset="fast", k=1, seed=None, batch_size=1,
+                    adaptive=None, chunk=None, num_candidates=None):
+    settings = {}
+    sampling = nullcontext()
+    if num_candidates is not None:
+        settings['num_autoregressive_samples'] = num_candidates
+    if adaptive is not None:
+        budget = adaptive.budget(text_part, num_candidates or PRESET_AUTOREGRESSIVE_SAMPLES[preset], batch_size)
+        # Os argumentos extras do tts_with_preset substituem os do preset
+        settings['num_autoregressive_samples'] = budget
+        sampling = adaptive.sampling(tts, budget, k, chunk)
+    with autoregressive_batch(tts, batch_size), sampling:
+        gen = tts.tts_with_preset(
+            text_part,
+            voice_samples=None,
+            conditioning_latents=conditioning_latents,
+            preset=preset,
+            k=k,
+            use_deterministic_seed=seed,
+            **settings
+        )
+    return gen.squeeze(0).cpu()
+
+
+# Variante da geração para a chave do cache: o modo de inferência (nada no fp32 original; ver
+# quantization.create_tts), o número de candidatos, se não for o do preset, e os parâmetros da
+# amostragem adaptativa, quando usada
+def generation_variant(precision='fp32', adaptive=None, num_candidates=None):
+    parts = [precision] if precision != 'fp32' else []
+    if num_candidates is not None:
+        parts.append(f'candidates:{num_candidates}')
+    if adaptive is not None:
+        parts.append(adaptive.variant)
+    return '/'.join(parts) or None
+
+
+# Gera as partes do texto longo uma a uma, na ordem original, entregando cada parte
+# assim que fica pronta (o tempo até o primeiro áudio é o de uma única parte).
+# Por padrão (lote 1) o resultado é idêntico, amostra a amostra, ao laço original do app.
+# Com batch_size>1 (ou 'auto') os candidatos autorregressivos de cada parte são gerados em
+# lotes (uma única passada do modelo para vários candidatos da mesma parte; partes diferentes
+# nunca dividem uma passada), o que é determinístico para uma semente fixa, mas NÃO é igual
+# ao resultado com lote 1.
+# Com um ResultCache (e o hash da voz), partes já geradas com os mesmos parâmetros
+# são lidas do cache em vez de sintetizadas de novo.
+def iter_longform(tts, texts, conditioning_latents, preset="fast", k=1, seed=None, batch_size=None,
+                  cache=None, voice_hash=None, adaptive=None, num_candidates=None):
+    batch_size = resolve_batch_size(batch_size, preset, adaptive, num_candidates)
+    variant = generation_variant(getattr(tts, 'inference_precision', 'fp32'), adaptive, num_candidates)
+    # Sem semente fixa o resultado não é reproduzível, então não há o que reaproveitar
+    use_cache = cache is not None and voice_hash is not None and seed is not None
+    for j, text_part in enumerate(texts):
+        with stage('chunk', chunk=j):
+            gen = None
+            if use_cache:
+                key = chunk_key(voice_hash, text_part, preset, k, seed, batch_size, variant)
+                with stage('cache_lookup'):
+                    cached = cache.get(key)
+                if cached is not None:
+                    gen = torch.from_numpy(cached)
+            if gen is None:
+                gen = synthesize_part(tts, text_part, conditioning_latents, preset, k, seed, batch_size,
+                                      adaptive, chunk=j, num_candidates=num_candidates)
+                if use_cache:
+                    with stage('cache_store'):
+                        cache.put(key, gen)
+        yield j, gen
+
+
+# Estimativa do número de amostras do áudio completo a partir do texto
+def estimate_samples(texts):
+    return sum(len(t) for t in texts) * SAMPLES_PER_CHAR
+
+
+# Monta o áudio longo em um único buffer contíguo, sem guardar as partes e sem torch.cat.
+# O buffer começa com o tamanho estimado e cresce geometricamente se a estimativa for curta.
+class LongformAssembler:
+    def __init__(self, estimated_samples, storage='float32', growth=1.5):
+        if storage not in STORAGE_DTYPES:
+            raise ValueError(f"Tipo de armazenamento não suportado: {storage}")
+        self.dtype, self.scale = STORAGE_DTYPES[storage]
+        self.growth = growth
+        self.buffer = np.empty(max(int(estimated_samples), 1), dtype=self.dtype)
+        self.length = 0
+        self.part_bounds = []
+        self.peak_bytes = self.buffer.nbytes
+
+    def _reserve(self, needed):
+        if needed <= len(self.buffer):
+            return
+        capacity = max(needed, int(len(self.buffer) * self.growth))
+        grown = np.empty(capacity, dtype=self.dtype)
+        grown[:self.length] = self.buffer[:self.length]
+        # Durante a cópia os dois buffers existem ao mesmo tempo
+        self.peak_bytes = max(self.peak_bytes, self.buffer.nbytes + grown.nbytes)
+        self.buffer = grown
+
+    # Copia a parte direto para o fim do buffer e devolve a posição (início, fim) dela.
+    # Com crossfade > 0, as primeiras `crossfade` amostras da parte se sobrepõem ao fim do
+    # áudio anterior, com rampas de potência constante (usado ao emendar partes regeneradas).
+    def append(self, gen, crossfade=0):
+        samples = gen.detach().cpu().numpy() if hasattr(gen, 'detach') else np.asarray(gen)
+        samples = samples.reshape(-1)
+        if self.scale != 1.0:
+            samples = np.clip(samples, -1.0, 1.0) * self.scale
+        overlap = min(crossfade, self.length, len(samples))
+        start, end = self.length - overlap, self.length - overlap + len(samples)
+        self._reserve(end)
+        if overlap:
+            ramp = np.linspace(0.0, np.pi / 2, overlap)
+            tail = self.buffer[start:self.length].astype(np.float32)
+            mixed = tail * np.cos(ramp) + samples[:overlap] * np.sin(ramp)
+            self.buffer[start:self.length] = np.clip(mixed, -self.scale, self.scale)
+        self.buffer[self.length:end] = samples[overlap:]
+        self.length = end
+        self.part_bounds.append((start, end))
+        return start, end
+
+    # Áudio completo como (1, S), uma view do buffer (sem cópia)
+    def result(self):
+        return self.buffer[:self.length].reshape(1, -1)
+
+    def stats(self):
+        return {
+            'samples': self.length,
+            'duration_s': self.length / SAMPLE_RATE,
+            'capacity': len(self.buffer),
+            'storage': self.dtype.__name__,
+            'peak_buffer_bytes': self.peak_bytes,
+        }
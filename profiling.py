@@ -0,0 +1,367 @@
+import contextvars
+import json
+import logging
+import os
+import resource
+import signal
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Arquivo onde os tempos de cada etapa são gravados (um JSON por linha, por etapa e parte)
+PROFILE_EVENTS_PATH = os.path.join("results", "profile", "events.jsonl")
+
+# Ao passar deste tamanho o arquivo de eventos é renomeado (events.jsonl.1, .2...) e recomeça;
+# só as cópias mais recentes são mantidas
+PROFILE_EVENTS_MAX_BYTES = 64 * 1024 ** 2
+PROFILE_EVENTS_BACKUPS = 3
+
+# Diretório dos traces de cProfile/pyinstrument pedidos sob demanda
+PROFILE_TRACES_DIR = os.path.join("results", "profile", "traces")
+
+# Intervalo de amostragem da memória residente durante as etapas (picos mais curtos que isso
+# ainda aparecem na leitura feita ao fim de cada etapa)
+RSS_SAMPLE_INTERVAL = 0.05
+
+_current_profiler = contextvars.ContextVar('tts_profiler', default=None)
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+# Memória residente atual do processo (no Linux via /proc; nos demais, o pico do processo)
+def current_rss():
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Thread que amostra a memória e atualiza o pico de todas as etapas abertas.
+# Só acorda enquanto existe alguma etapa em andamento.
+class _RssSampler:
+    def __init__(self):
+        self._open = {}
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        threading.Thread(target=self._run, name='rss-sampler', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            rss = current_rss()
+            with self._lock:
+                for event in self._open.values():
+                    event['peak_rss_bytes'] = max(event['peak_rss_bytes'], rss)
+            time.sleep(RSS_SAMPLE_INTERVAL)
+
+    def open(self, event):
+        with self._lock:
+            self._open[id(event)] = event
+            self._active.set()
+
+    def close(self, event):
+        with self._lock:
+            self._open.pop(id(event), None)
+            if not self._open:
+                self._active.clear()
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def _get_sampler():
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = _RssSampler()
+        return _sampler
+
+
+# Métricas acumuladas no processo, expostas no formato texto do Prometheus
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _record_metric(stage_name, seconds, peak_rss_bytes):
+    with _metrics_lock:
+        metric = _metrics.setdefault(stage_name, {'seconds': 0.0, 'count': 0, 'peak_rss_bytes': 0})
+        metric['seconds'] += seconds
+        metric['count'] += 1
+        metric['peak_rss_bytes'] = max(metric['peak_rss_bytes'], peak_rss_bytes)
+
+
+def render_prometheus():
+    lines = [
+        '# HELP tts_stage_seconds Tempo de parede gasto em cada etapa da geração.',
+        '# TYPE tts_stage_seconds summary',
+    ]
+    with _metrics_lock:
+        metrics = {name: dict(metric) for name, metric in _metrics.items()}
+    for name, metric in sorted(metrics.items()):
+        lines.append(f'tts_stage_seconds_sum{{stage="{name}"}} {metric["seconds"]:.6f}')
+        lines.append(f'tts_stage_seconds_count{{stage="{name}"}} {metric["count"]}')
+    lines.append('# HELP tts_stage_peak_rss_bytes Maior memória residente observada durante cada etapa.')
+    lines.append('# TYPE tts_stage_peak_rss_bytes gauge')
+    for name, metric in sorted(metrics.items()):
+        lines.append(f'tts_stage_peak_rss_bytes{{stage="{name}"}} {metric["peak_rss_bytes"]}')
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Sobe um endpoint HTTP simples (GET em qualquer caminho) com as métricas do processo
+def start_metrics_server(port, host='0.0.0.0'):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logging.info(f"Métricas disponíveis em http://{host}:{port}/metrics")
+    return server
+
+
+# Pedido de trace sob demanda: `kill -USR1 <pid>` faz o próximo pedido ser perfilado
+_trace_next = threading.Event()
+
+
+def request_trace():
+    _trace_next.set()
+
+
+def install_trace_signal():
+    signal.signal(signal.SIGUSR1, lambda signum, frame: request_trace())
+
+
+# Mede tempo de parede e pico de memória de cada etapa de um pedido, por parte e no total.
+# No arquivo de eventos vai uma linha por (etapa, parte) com a soma das chamadas; com
+# raw_events=True vai cada chamada (centenas por parte no Tortoise instrumentado).
+class Profiler:
+    def __init__(self, request_id, events_path=PROFILE_EVENTS_PATH, trace=None, raw_events=False):
+        self.request_id = request_id
+        self.events_path = events_path
+        self.trace = trace
+        self.raw_events = raw_events
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name, chunk=None):
+        stack = self._stack()
+        # Etapas internas (autorregressivo, difusão...) herdam a parte da etapa que as contém
+        if chunk is None and stack:
+            chunk = stack[-1]['chunk']
+        event = {
+            'request_id': self.request_id,
+            'stage': name,
+            'chunk': chunk,
+            'start': time.time(),
+            'peak_rss_bytes': current_rss(),
+        }
+        sampler = _get_sampler()
+        sampler.open(event)
+        stack.append(event)
+        start = time.perf_counter()
+        try:
+            yield event
+        finally:
+            event['seconds'] = time.perf_counter() - start
+            stack.pop()
+            sampler.close(event)
+            event['peak_rss_bytes'] = max(event['peak_rss_bytes'], current_rss())
+            with self._lock:
+                self.events.append(event)
+            _record_metric(name, event['seconds'], event['peak_rss_bytes'])
+
+    # Junta ao pedido eventos medidos em outro processo (ex.: um processo do pool de partes)
+    def add_events(self, events):
+        for event in events:
+            event = dict(event, request_id=self.request_id)
+            with self._lock:
+                self.events.append(event)
+            _record_metric(event['stage'], event['seconds'], event['peak_rss_bytes'])
+
+    # Torna este profiler o ativo durante o pedido; opcionalmente grava um trace completo
+    @contextmanager
+    def activate(self):
+        trace = self.trace or ('cprofile' if _trace_next.is_set() else None)
+        _trace_next.clear()
+        token = _current_profiler.set(self)
+        tracer = _start_trace(trace)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.wall_seconds = time.perf_counter() - start
+            _current_profiler.reset(token)
+            if tracer is not None:
+                _stop_trace(trace, tracer, self.request_id)
+            self.write_events()
+
+    def summary(self):
+        stages = {}
+        chunks = {}
+        with self._lock:
+            events = list(self.events)
+        for event in events:
+            stage = stages.setdefault(event['stage'], {'seconds': 0.0, 'count': 0, 'peak_rss_bytes': 0})
+            stage['seconds'] += event['seconds']
+            stage['count'] += 1
+            stage['peak_rss_bytes'] = max(stage['peak_rss_bytes'], event['peak_rss_bytes'])
+            if event['stage'] == 'chunk':
+                chunks[str(event['chunk'])] = event['seconds']
+        return {
+            'request_id': self.request_id,
+            'wall_seconds': getattr(self, 'wall_seconds', None),
+            'stages': stages,
+            'chunks': chunks,
+        }
+
+    # Eventos somados por (etapa, parte), na ordem em que cada par apareceu
+    def aggregated_events(self):
+        aggregated = {}
+        with self._lock:
+            events = list(self.events)
+        for event in events:
+            entry = aggregated.get((event['stage'], event['chunk']))
+            if entry is None:
+                aggregated[(event['stage'], event['chunk'])] = {
+                    'request_id': self.request_id,
+                    'stage': event['stage'],
+                    'chunk': event['chunk'],
+                    'start': event['start'],
+                    'seconds': event['seconds'],
+                    'count': 1,
+                    'peak_rss_bytes': event['peak_rss_bytes'],
+                }
+                continue
+            entry['start'] = min(entry['start'], event['start'])
+            entry['seconds'] += event['seconds']
+            entry['count'] += 1
+            entry['peak_rss_bytes'] = max(entry['peak_rss_bytes'], event['peak_rss_bytes'])
+        return list(aggregated.values())
+
+    def write_events(self):
+        if self.events_path is None:
+            return
+        os.makedirs(os.path.dirname(self.events_path), exist_ok=True)
+        if self.raw_events:
+            with self._lock:
+                events = list(self.events)
+        else:
+            events = self.aggregated_events()
+        lines = [json.dumps(event) for event in events]
+        lines.append(json.dumps({'request_id': self.request_id, 'stage': 'summary', 'summary': self.summary()}))
+        with _events_file_lock:
+            _rotate_events(self.events_path)
+            with open(self.events_path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+
+
+_events_file_lock = threading.Lock()
+
+
+# Renomeia o arquivo de eventos quando ele passa do limite, descartando a cópia mais antiga
+def _rotate_events(path, max_bytes=PROFILE_EVENTS_MAX_BYTES, backups=PROFILE_EVENTS_BACKUPS):
+    try:
+        if os.path.getsize(path) < max_bytes:
+            return
+    except FileNotFoundError:
+        return
+    # Outro worker pode estar girando o mesmo arquivo ao mesmo tempo; o que ele já moveu é ignorado
+    try:
+        for i in range(backups - 1, 0, -1):
+            if os.path.exists(f'{path}.{i}'):
+                os.replace(f'{path}.{i}', f'{path}.{i + 1}')
+        os.replace(path, f'{path}.1')
+    except FileNotFoundError:
+        pass
+
+
+def _start_trace(trace):
+    if trace == 'pyinstrument':
+        from pyinstrument import Profiler as PyinstrumentProfiler
+        tracer = PyinstrumentProfiler()
+        tracer.start()
+        return tracer
+    if trace == 'cprofile':
+        import cProfile
+        tracer = cProfile.Profile()
+        tracer.enable()
+        return tracer
+    return None
+
+
+def _stop_trace(trace, tracer, request_id):
+    os.makedirs(PROFILE_TRACES_DIR, exist_ok=True)
+    if trace == 'pyinstrument':
+        tracer.stop()
+        path = os.path.join(PROFILE_TRACES_DIR, f'{request_id}.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(tracer.output_html())
+    else:
+        tracer.disable()
+        path = os.path.join(PROFILE_TRACES_DIR, f'{request_id}.prof')
+        tracer.dump_stats(path)
+    logging.info(f"Trace do pedido {request_id} salvo em {path}.")
+
+
+# Etapa no profiler ativo; sem profiler ativo não faz nada (custo desprezível no caminho quente)
+def stage(name, chunk=None):
+    profiler = _current_profiler.get()
+    if profiler is None:
+        return nullcontext()
+    return profiler.stage(name, chunk)
+
+
+# Eventos de outro processo entram no profiler ativo; sem profiler ativo são descartados
+def add_events(events):
+    profiler = _current_profiler.get()
+    if profiler is not None:
+        profiler.add_events(events)
+
+
+def _timed(name, fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+# Instrumenta as etapas internas do tts_with_preset do Tortoise: amostragem autorregressiva,
+# ranqueamento CLVP, latentes do autorregressivo, difusão, vocoder e redação
+def instrument_tts(tts):
+    if getattr(tts, '_profiling_instrumented', False):
+        return tts
+    import tortoise.api
+
+    tts.autoregressive.inference_speech = _timed('autoregressive', tts.autoregressive.inference_speech)
+    tts.autoregressive.forward = _timed('autoregressive_latents', tts.autoregressive.forward)
+    tts.clvp.forward = _timed('clvp', tts.clvp.forward)
+    tts.vocoder.inference = _timed('vocoder', tts.vocoder.inference)
+    if getattr(tts, 'aligner', None) is not None:
+        tts.aligner.redact = _timed('redaction', tts.aligner.redact)
+    # A difusão é uma função do módulo, procurada a cada chamada de tts()
+    if not hasattr(tortoise.api.do_spectrogram_diffusion, '_profiling_original'):
+        original = tortoise.api.do_spectrogram_diffusion
+        tortoise.api.do_spectrogram_diffusion = _timed('diffusion', original)
+        tortoise.api.do_spectrogram_diffusion._profiling_original = original
+    tts._profiling_instrumented = True
+    return tts
@@ -0,0 +1,183 @@
+import argparse
+import functools
+import hashlib
+import json
+import logging
+import os
+import time
+
+import torch
+from torch import nn
+
+# Modos de inferência aceitos por create_tts
+PRECISIONS = ('fp32', 'int8', 'bf16')
+
+# Diretório dos módulos já quantizados (a conversão acontece uma única vez por checkpoint)
+QUANTIZED_CACHE_DIR = os.path.join("cache", "quantized")
+
+# Submódulos do Tortoise quantizados no modo int8 e o checkpoint de cada um. O vocoder é quase
+# todo convolucional e fica em fp32.
+QUANTIZED_MODULES = {
+    'autoregressive': 'autoregressive.pth',
+    'clvp': 'clvp2.pth',
+    'diffusion': 'diffusion_decoder.pth',
+}
+
+# Texto usado no relatório de velocidade e desvio em relação ao fp32
+REPORT_TEXT = "The quick brown fox jumps over the lazy dog, and then it runs back home before the rain."
+
+
+# O GPT-2 do transformers usa Conv1D (pesos transpostos) nas projeções de atenção e MLP;
+# troca por nn.Linear equivalentes para que a quantização dinâmica os alcance
+def _conv1d_to_linear(module):
+    try:
+        from transformers.pytorch_utils import Conv1D
+    except ImportError:
+        from transformers.modeling_utils import Conv1D
+
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            linear = nn.Linear(child.weight.shape[0], child.weight.shape[1])
+            linear.weight = nn.Parameter(child.weight.detach().t().contiguous(), requires_grad=False)
+            linear.bias = nn.Parameter(child.bias.detach(), requires_grad=False)
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+    return module
+
+
+# Quantização dinâmica int8 das camadas lineares (pesos em int8, ativações quantizadas na hora)
+def quantize_module(module):
+    _conv1d_to_linear(module)
+    return torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+# Caminho do módulo quantizado em cache: muda se o checkpoint ou a versão do torch mudarem
+def quantized_cache_path(name, checkpoint_path, cache_dir=QUANTIZED_CACHE_DIR):
+    st = os.stat(checkpoint_path)
+    key = json.dumps([os.path.abspath(checkpoint_path), st.st_mtime_ns, st.st_size, torch.__version__])
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f'{name}-int8-{digest}.pt')
+
+
+# Troca os submódulos do TextToSpeech pelas versões int8, lidas do cache ou convertidas e salvas
+def quantize_tts(tts, models_dir=None, cache_dir=QUANTIZED_CACHE_DIR):
+    from tortoise.api import MODELS_DIR, get_model_path
+
+    for name, checkpoint in QUANTIZED_MODULES.items():
+        path = quantized_cache_path(name, get_model_path(checkpoint, models_dir or MODELS_DIR), cache_dir)
+        if os.path.exists(path):
+            module = torch.load(path, map_location='cpu', weights_only=False)
+        else:
+            start = time.perf_counter()
+            module = quantize_module(getattr(tts, name))
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = path + f'.tmp{os.getpid()}'
+            torch.save(module, tmp_path)
+            os.replace(tmp_path, path)
+            logging.info(f"Módulo '{name}' quantizado em {time.perf_counter() - start:.1f}s e salvo em {path}.")
+        setattr(tts, name, module.eval())
+    return tts
+
+
+# Roda as gerações do TextToSpeech em bfloat16 (autocast na CPU); o áudio sai em float32
+def enable_bf16(tts):
+    generate = tts.tts
+
+    @functools.wraps(generate)
+    def tts_bf16(*args, **kwargs):
+        with torch.autocast('cpu', dtype=torch.bfloat16):
+            result = generate(*args, **kwargs)
+        return result.float() if isinstance(result, torch.Tensor) else result
+
+    tts.tts = tts_bf16
+    return tts
+
+
+# Cria o TextToSpeech no modo de inferência pedido: 'fp32' (original), 'int8' (quantização
+# dinâmica do autorregressivo, CLVP e difusão) ou 'bf16' (autocast). Com mmap_weights, os pesos
+# fp32 vêm dos checkpoints mapeados em memória (shared_weights).
+def create_tts(precision='fp32', mmap_weights=False, cache_dir=QUANTIZED_CACHE_DIR, **tts_kwargs):
+    from lazy_tts import load_text_to_speech
+    from shared_weights import load_shared_text_to_speech
+
+    if precision not in PRECISIONS:
+        raise ValueError(f"Precisão não suportada: {precision}")
+    tts = load_shared_text_to_speech(**tts_kwargs) if mmap_weights else load_text_to_speech(**tts_kwargs)
+    if precision == 'int8':
+        quantize_tts(tts, tts_kwargs.get('models_dir'), cache_dir)
+    elif precision == 'bf16':
+        enable_bf16(tts)
+    # O modo muda o áudio gerado, então entra na chave do cache de resultados
+    tts.inference_precision = precision
+    return tts
+
+
+def _mfcc(audio):
+    import librosa
+
+    from audio_sink import SAMPLE_RATE
+    from evaluate_clones import N_MFCC
+
+    return librosa.feature.mfcc(y=audio, sr=SAMPLE_RATE, n_mfcc=N_MFCC)
+
+
+# Relatório de cada modo: fator de tempo real por voz e distância MFCC (DTW) até o áudio fp32
+# gerado com a mesma voz, texto e semente
+def precision_report(voices_dir, precisions=PRECISIONS, text=REPORT_TEXT, preset='fast', seed=0):
+    from audio_sink import SAMPLE_RATE
+    from evaluate_clones import mfcc_dtw_distance
+    from longform import synthesize_part
+    from voice_cache import get_conditioning_latents
+
+    voices = sorted(v for v in os.listdir(voices_dir) if os.path.isdir(os.path.join(voices_dir, v)))
+    # O fp32 é sempre medido primeiro: é a referência do desvio
+    precisions = ['fp32'] + [p for p in precisions if p != 'fp32']
+    reference = {}
+    rows = []
+    for precision in precisions:
+        tts = create_tts(precision)
+        for voice in voices:
+            latents = get_conditioning_latents(tts, voice, os.path.join(voices_dir, voice))
+            start = time.perf_counter()
+            audio = synthesize_part(tts, text, latents, preset, 1, seed).numpy().reshape(-1)
+            seconds = time.perf_counter() - start
+            mfcc = _mfcc(audio)
+            if precision == 'fp32':
+                reference[voice] = (mfcc, seconds)
+            rows.append({
+                'voice': voice,
+                'precision': precision,
+                'seconds': seconds,
+                'audio_seconds': len(audio) / SAMPLE_RATE,
+                'real_time_factor': seconds / (len(audio) / SAMPLE_RATE),
+                'speedup_vs_fp32': reference[voice][1] / seconds,
+                'mfcc_drift_vs_fp32': mfcc_dtw_distance(reference[voice][0], mfcc),
+            })
+            logging.info(f"{precision} / {voice}: RTF {rows[-1]['real_time_factor']:.2f}, "
+                         f"desvio MFCC {rows[-1]['mfcc_drift_vs_fp32']:.2f}")
+        del tts
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mede velocidade (RTF) e desvio de qualidade (MFCC) dos modos de inferência em relação ao fp32.")
+    parser.add_argument('--voices-dir', default=os.path.join('voices_cloning_app', 'voices'))
+    parser.add_argument('--precisions', nargs='+', default=list(PRECISIONS), choices=PRECISIONS)
+    parser.add_argument('--text', default=REPORT_TEXT)
+    parser.add_argument('--preset', default='fast')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join('results', 'precision_report.json'))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    rows = precision_report(args.voices_dir, args.precisions, args.text, args.preset, args.seed)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, indent=1)
+    logging.info(f"Relatório salvo em {args.output}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from itertools import groupby
+
+from audio_sink import AUDIO_FORMATS, SAMPLE_RATE, _write_file, encode_audio
+from jobs import parse_ar_batch
+
+# Pasta de vozes padrão (a mesma da ingestão em lote e da API)
+DEFAULT_VOICES_DIR = os.path.join('voices_cloning_app', 'voices')
+
+# Arquivos de saída prontos que esperam gravação; com a fila cheia a geração espera o disco
+DEFAULT_MAX_PENDING = 8
+
+# Sufixo do registro de progresso, gravado ao lado do manifesto
+CHECKPOINT_SUFFIX = '.progress.jsonl'
+
+
+# Formato de saída a partir da extensão do arquivo (wav, flac ou opus)
+def output_format(path):
+    audio_format = os.path.splitext(path)[1].lstrip('.').lower()
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"Formato de saída não suportado: {path}")
+    return audio_format
+
+
+# Lê o manifesto (CSV com cabeçalho ou JSONL) com as colunas voice, text e output e, por
+# linha, preset e seed opcionais
+def load_rows(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            records = list(csv.DictReader(f))
+        else:
+            records = [json.loads(line) for line in f if line.strip()]
+    rows = []
+    for i, record in enumerate(records):
+        missing = [c for c in ('voice', 'text', 'output') if not record.get(c)]
+        if missing:
+            raise ValueError(f"Linha {i + 1} do manifesto sem {', '.join(missing)}.")
+        # Uma extensão inválida interrompe a leitura, não a gravação depois de a linha ser gerada
+        try:
+            output_format(record['output'])
+        except ValueError as e:
+            raise ValueError(f"Linha {i + 1} do manifesto: {e}") from None
+        seed = record.get('seed')
+        rows.append({
+            'row': i,
+            'voice': record['voice'],
+            'text': record['text'],
+            'output': record['output'],
+            'preset': record.get('preset') or None,
+            'seed': int(seed) if seed not in (None, '') else None,
+        })
+    return rows
+
+
+# Identifica a linha pelo conteúdo e pelos parâmetros efetivos da geração (preset e semente já
+# com os padrões da execução, precisão, amostragem adaptativa e lote autorregressivo): se o
+# manifesto ou as opções mudarem, as linhas afetadas são geradas de novo
+def row_key(row, preset='fast', seed=None, precision='fp32', adaptive=None, ar_batch=None):
+    fields = [row['voice'], row['text'], row['output'], row['preset'] or preset,
+              row['seed'] if row['seed'] is not None else seed, precision,
+              adaptive.variant if adaptive is not None else None]
+    # O lote 1 (padrão) gera o mesmo áudio de antes, então as chaves antigas continuam valendo
+    if ar_batch not in (None, 1):
+        fields.append(ar_batch)
+    return hashlib.sha256(json.dumps(fields).encode('utf-8')).hexdigest()
+
+
+def checkpoint_path(manifest_path):
+    return manifest_path + CHECKPOINT_SUFFIX
+
+
+# Linhas já concluídas em execuções anteriores (e cujo arquivo de saída ainda existe)
+def load_checkpoint(path):
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Última linha cortada por uma interrupção no meio da gravação
+                continue
+            if os.path.exists(entry['output']):
+                done[entry['key']] = entry
+    return done
+
+
+# Thread única que codifica e grava as saídas e registra o progresso. A fila é limitada:
+# se o disco ficar para trás, put() bloqueia e a memória não cresce com o áudio pendente.
+class OutputWriter:
+    def __init__(self, checkpoint, max_pending=DEFAULT_MAX_PENDING):
+        self.checkpoint = checkpoint
+        self.failures = []
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name='manifest-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, row, audio):
+        self._queue.put((row, audio))
+
+    def _run(self):
+        with open(self.checkpoint, 'a', encoding='utf-8') as log:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                row, audio = item
+                try:
+                    self._write(row, audio)
+                except Exception as e:
+                    logging.error(f"Erro ao gravar {row['output']}: {e}")
+                    self.failures.append(row['row'])
+                    continue
+                # A linha só conta como concluída depois que o arquivo está no lugar
+                log.write(json.dumps({'key': row['key'], 'row': row['row'], 'output': row['output'],
+                                      'audio_seconds': audio.shape[-1] / SAMPLE_RATE}) + '\n')
+                log.flush()
+
+    def _write(self, row, audio):
+        encoded = encode_audio(audio, SAMPLE_RATE, output_format(row['output']))
+        os.makedirs(os.path.dirname(row['output']) or '.', exist_ok=True)
+        _write_file(row['output'], encoded, row['row'])
+
+    # Espera as gravações pendentes e encerra a thread
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+# Gera todas as linhas pendentes do manifesto. As linhas são agrupadas por voz, então os
+# latentes de cada voz são calculados (ou lidos do cache) uma única vez, e o modelo fica
+# carregado durante a execução inteira.
+def render_manifest(manifest_path, voices_dir=DEFAULT_VOICES_DIR, preset='fast', seed=None, precision='fp32',
+                    mmap_weights=False, adaptive=None, max_pending=DEFAULT_MAX_PENDING, ar_batch=None,
+                    storage='float32'):
+    from longform import LongformAssembler, estimate_samples, iter_longform, split_text
+    from quantization import create_tts
+    from result_cache import ResultCache
+    from voice_cache import get_conditioning_latents, voice_content_hash
+
+    rows = load_rows(manifest_path)
+    checkpoint = checkpoint_path(manifest_path)
+    done = load_checkpoint(checkpoint)
+    for row in rows:
+        row['key'] = row_key(row, preset, seed, precision, adaptive, ar_batch)
+    pending = [row for row in rows if row['key'] not in done]
+    logging.info(f"{len(pending)} linha(s) para gerar ({len(rows) - len(pending)} já concluída(s)).")
+    if not pending:
+        return {'rows': 0, 'failures': 0, 'audio_seconds': 0.0, 'wall_seconds': 0.0, 'throughput': 0.0}
+
+    # Ordenação estável: dentro de cada voz, a ordem do manifesto é mantida
+    pending.sort(key=lambda row: row['voice'])
+    started = time.perf_counter()
+    tts = create_tts(precision, mmap_weights)
+    cache = ResultCache()
+    writer = OutputWriter(checkpoint, max_pending)
+    audio_seconds = 0.0
+    failures = []
+    try:
+        for voice, group in groupby(pending, key=lambda row: row['voice']):
+            group = list(group)
+            voice_dir = os.path.join(voices_dir, voice)
+            try:
+                conditioning_latents = get_conditioning_latents(tts, voice, voice_dir)
+                voice_hash = voice_content_hash(voice_dir)
+            except Exception as e:
+                logging.error(f"Voz '{voice}' indisponível ({e}); {len(group)} linha(s) ignorada(s).")
+                failures.extend(row['row'] for row in group)
+                continue
+            logging.info(f"Voz '{voice}': {len(group)} linha(s).")
+            for row in group:
+                if adaptive is not None:
+                    adaptive.history.clear()
+                try:
+                    texts = split_text(row['text'])
+                    assembler = LongformAssembler(estimate_samples(texts), storage)
+                    row_seed = row['seed'] if row['seed'] is not None else seed
+                    for _, gen in iter_longform(tts, texts, conditioning_latents, row['preset'] or preset,
+                                                seed=row_seed, batch_size=ar_batch, cache=cache,
+                                                voice_hash=voice_hash, adaptive=adaptive):
+                        assembler.append(gen)
+                except Exception as e:
+                    logging.error(f"Erro na linha {row['row'] + 1} ({row['output']}): {e}")
+                    failures.append(row['row'])
+                    continue
+                # Cópia: o buffer do montador é maior que o áudio e seria mantido inteiro na fila
+                audio = assembler.result().copy()
+                audio_seconds += audio.shape[-1] / SAMPLE_RATE
+                writer.put(row, audio)
+    finally:
+        writer.close()
+    failures.extend(writer.failures)
+
+    wall_seconds = time.perf_counter() - started
+    return {
+        'rows': len(pending) - len(failures),
+        'failures': len(failures),
+        'audio_seconds': audio_seconds,
+        'wall_seconds': wall_seconds,
+        # Segundos de áudio gerados por segundo de relógio (inclui carregar o modelo e as vozes)
+        'throughput': audio_seconds / wall_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Gera em lote as linhas (voice, text, output) de um manifesto CSV ou JSONL, agrupadas "
+                    "por voz; uma execução interrompida continua de onde parou.")
+    parser.add_argument('manifest', help="Arquivo .csv (com cabeçalho) ou .jsonl.")
+    parser.add_argument('--voices-dir', default=DEFAULT_VOICES_DIR, help="Pasta com uma subpasta por voz.")
+    parser.add_argument('--preset', default='fast', help="Preset das linhas que não definem o seu.")
+    parser.add_argument('--seed', type=int, default=None, help="Semente das linhas que não definem a sua.")
+    parser.add_argument('--threads', type=int, default=None, help="Threads do torch.")
+    parser.add_argument('--precision', choices=['fp32', 'int8', 'bf16'], default='fp32')
+    parser.add_argument('--mmap-weights', action='store_true', help="Mapeia os pesos do modelo em memória.")
+    parser.add_argument('--adaptive', action='store_true', help="Amostragem adaptativa de candidatos.")
+    parser.add_argument('--ar-batch', type=parse_ar_batch, default=None,
+                        help="Candidatos autorregressivos por passada: 1 (padrão), 'auto' ou N.")
+    parser.add_argument('--storage', choices=['float32', 'float16', 'int16'], default='float32',
+                        help="Tipo do buffer do áudio de cada linha: float16 e int16 usam metade da memória.")
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help="Saídas prontas esperando gravação antes de a geração aguardar o disco.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+    adaptive = None
+    if args.adaptive:
+        from adaptive_sampling import AdaptiveSampling
+        adaptive = AdaptiveSampling()
+    summary = render_manifest(args.manifest, args.voices_dir, args.preset, args.seed, args.precision,
+                              args.mmap_weights, adaptive, args.max_pending, args.ar_batch, args.storage)
+    logging.info(f"{summary['rows']} linha(s) gerada(s), {summary['failures']} com erro: "
+                 f"{summary['audio_seconds']:.1f}s de áudio em {summary['wall_seconds']:.1f}s "
+                 f"({summary['throughput']:.2f} s de áudio por segundo).")
+
+
+if __name__ == '__main__':
+    main()
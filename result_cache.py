@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+
+import numpy as np
+
+# Diretório do cache de partes já sintetizadas
+RESULT_CACHE_DIR = os.path.join("cache", "results")
+
+# Tamanho máximo do cache em disco antes de descartar as entradas menos usadas
+RESULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Fração do limite que sobra depois de um descarte: a folga evita varrer o cache a cada gravação
+RESULT_CACHE_LOW_WATER = 0.9
+
+
+# Normaliza o texto de uma parte para que diferenças só de espaços não gerem outra chave
+def normalize_text(text):
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+# Chave de uma parte: tudo o que determina o áudio gerado para ela. `variant` identifica um modo
+# de inferência diferente do original (ex.: 'int8'); sem ele, as chaves antigas continuam válidas.
+def chunk_key(voice_hash, text, preset, k, seed, batch_size, variant=None):
+    fields = [voice_hash, normalize_text(text), preset, k, seed, batch_size]
+    payload = json.dumps(fields + [variant] if variant else fields)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# Cache em disco das partes geradas, com descarte LRU limitado por tamanho.
+# O mtime de cada arquivo marca o último uso, então vários processos podem compartilhar o diretório.
+# O tamanho em memória só conta as gravações deste processo; ele é corrigido por uma nova varredura
+# a cada descarte e sempre que este processo grava o equivalente à folga do limite.
+class ResultCache:
+    def __init__(self, cache_dir=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES,
+                 low_water=RESULT_CACHE_LOW_WATER):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.low_water_bytes = int(max_bytes * low_water)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+        self._written = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.npy')
+
+    # Lista (último uso, caminho, tamanho) de todas as entradas
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for f in files:
+                if f.endswith('.npy'):
+                    path = os.path.join(root, f)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield st.st_mtime, path, st.st_size
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            samples = np.load(path)
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        # Marca a entrada como usada agora (outro processo pode tê-la descartado depois da leitura)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return samples
+
+    def put(self, key, gen):
+        samples = gen.detach().cpu().numpy() if hasattr(gen, 'detach') else np.asarray(gen)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+        # Nome temporário único: dois processos gravando a mesma parte não usam o mesmo arquivo
+        fd, tmp_path = tempfile.mkstemp(prefix=f'{key}.', suffix='.tmp', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, samples)
+            # mkstemp cria o arquivo só para o dono; as entradas continuam legíveis como antes
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        with self._lock:
+            growth = os.path.getsize(path) - previous_size
+            self._size += growth
+            self._written += growth
+            # Outros processos também gravam no diretório: o tamanho real pode já ter passado do limite
+            rescan = self._size > self.max_bytes or self._written >= self.max_bytes - self.low_water_bytes
+        if rescan:
+            self.evict()
+
+    # Mede o cache de novo e, se ele passou do limite, remove as entradas usadas há mais tempo
+    # até sobrar só a fração low_water do limite
+    def evict(self):
+        with self._lock:
+            entries = sorted(self._entries())
+            size = sum(s for _, _, s in entries)
+            evicted = 0
+            if size > self.max_bytes:
+                for _, path, entry_size in entries:
+                    if size <= self.low_water_bytes:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    size -= entry_size
+                    evicted += 1
+            self.evictions += evicted
+            self._size = size
+            self._written = 0
+        if evicted:
+            logging.info(f"Cache de resultados reduzido para {size} bytes ({evicted} entrada(s) descartada(s)).")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'size_bytes': self._size,
+            }
@@ -0,0 +1,175 @@
+import logging
+import time
+
+from chunker import estimate_tokens
+from jobs import (JOB_SYNTHESIZE, JOBS_DB_PATH, STATUS_QUEUED, STATUS_RUNNING, WORKER_READY, WORKER_TIMEOUT, connect,
+                  submit_job)
+
+# Presets que o escalonador escolhe, do melhor para o mais barato, e os candidatos de cada um
+# (os mesmos de longform, sem importar o torch no processo da UI ou da API)
+PRESET_CANDIDATES = {
+    'standard': 256,
+    'fast': 96,
+    'ultra_fast': 16,
+}
+
+# Frações dos candidatos do preset testadas antes de descer para o preset seguinte
+CANDIDATE_FRACTIONS = (1, 0.5, 0.25)
+MIN_CANDIDATES = 4
+
+# Custo inicial (segundos de CPU por token de texto, com os candidatos do preset), usado até
+# existirem medições de cada opção
+DEFAULT_SECONDS_PER_TOKEN = {
+    'standard': 1.6,
+    'fast': 0.6,
+    'ultra_fast': 0.15,
+}
+
+# Parte do custo que não depende do número de candidatos (difusão e vocoder)
+FIXED_COST_FRACTION = 0.4
+
+# Peso de cada medição nova na média móvel exponencial do custo
+EWMA_ALPHA = 0.3
+
+# O plano escolhido precisa caber nesta fração do prazo (margem para o erro da previsão)
+DEADLINE_MARGIN = 0.85
+
+
+# Opções (preset, candidatos) na ordem de qualidade, da melhor para a mais barata
+def schedule_options():
+    options = []
+    for preset, default in PRESET_CANDIDATES.items():
+        for fraction in CANDIDATE_FRACTIONS:
+            candidates = max(MIN_CANDIDATES, int(default * fraction))
+            if (preset, candidates) not in options:
+                options.append((preset, candidates))
+    return options
+
+
+# Custo inicial de uma opção: a parte que depende dos candidatos encolhe com eles
+def prior_seconds_per_token(preset, candidates):
+    scale = FIXED_COST_FRACTION + (1 - FIXED_COST_FRACTION) * candidates / PRESET_CANDIDATES[preset]
+    return DEFAULT_SECONDS_PER_TOKEN[preset] * scale
+
+
+# Custos medidos de todas as opções; as que ainda não foram medidas usam o custo inicial
+def load_costs(conn):
+    costs = {option: prior_seconds_per_token(*option) for option in schedule_options()}
+    for row in conn.execute("SELECT preset, candidates, seconds_per_token FROM preset_costs"):
+        costs[(row['preset'], row['candidates'])] = row['seconds_per_token']
+    return costs
+
+
+def predict_seconds(costs, text, preset, candidates=None):
+    if preset not in PRESET_CANDIDATES:
+        # Presets fora do escalonador (high_quality) custam pelo menos o mesmo que o standard
+        preset, candidates = 'standard', None
+    candidates = candidates or PRESET_CANDIDATES[preset]
+    spt = costs.get((preset, candidates)) or prior_seconds_per_token(preset, candidates)
+    return estimate_tokens(text) * spt
+
+
+# Segundos de trabalho à frente de um pedido novo: o previsto para os trabalhos na fila e o
+# que falta aos que estão em andamento, dividido entre os workers prontos
+def backlog_seconds(conn, costs, now=None):
+    now = time.time() if now is None else now
+    rows = conn.execute(
+        "SELECT text, preset, candidates, predicted_seconds, status, started_at FROM jobs "
+        "WHERE kind = ? AND status IN (?, ?)",
+        (JOB_SYNTHESIZE, STATUS_QUEUED, STATUS_RUNNING)
+    ).fetchall()
+    total = 0.0
+    for row in rows:
+        predicted = row['predicted_seconds']
+        if predicted is None:
+            predicted = predict_seconds(costs, row['text'], row['preset'], row['candidates'])
+        if row['status'] == STATUS_RUNNING and row['started_at']:
+            predicted -= now - row['started_at']
+        total += max(0.0, predicted)
+    workers = conn.execute(
+        "SELECT COUNT(*) FROM workers WHERE status = ? AND heartbeat_at > ?",
+        (WORKER_READY, now - WORKER_TIMEOUT)
+    ).fetchone()[0]
+    return total / max(1, workers)
+
+
+# Escolhe o melhor preset e número de candidatos que ainda terminam dentro de latency_target
+# (segundos, contando a espera na fila). Sem nenhuma opção no prazo, usa a mais barata.
+def choose_preset(text, latency_target, db_path=JOBS_DB_PATH):
+    conn = connect(db_path)
+    try:
+        costs = load_costs(conn)
+        wait = backlog_seconds(conn, costs)
+    finally:
+        conn.close()
+    budget = latency_target * DEADLINE_MARGIN - wait
+    options = schedule_options()
+    for preset, candidates in options:
+        predicted = predict_seconds(costs, text, preset, candidates)
+        if predicted <= budget:
+            break
+    else:
+        preset, candidates = options[-1]
+        predicted = predict_seconds(costs, text, preset, candidates)
+        logging.warning(f"Nenhum preset cabe no prazo de {latency_target:.0f}s (fila: {wait:.0f}s); "
+                        f"usando {preset} com {candidates} candidatos.")
+    return {
+        'preset': preset,
+        # O número padrão do preset é guardado como None (mesma chave de cache das gerações comuns)
+        'candidates': None if candidates == PRESET_CANDIDATES[preset] else candidates,
+        'predicted_seconds': predicted,
+        'wait_seconds': wait,
+    }
+
+
+# Enfileira um pedido com prazo: o preset e os candidatos são escolhidos pelo escalonador
+def submit_scheduled_job(voice_name, voice_dir, text, latency_target, seed=None, db_path=JOBS_DB_PATH,
+                         incremental=False):
+    plan = choose_preset(text, latency_target, db_path)
+    job_id = submit_job(voice_name, voice_dir, text, preset=plan['preset'], seed=seed, db_path=db_path,
+                        incremental=incremental, candidates=plan['candidates'], latency_target=latency_target,
+                        predicted_seconds=plan['predicted_seconds'])
+    logging.info(f"Trabalho {job_id}: {plan['preset']} ({plan['candidates'] or 'padrão'} candidatos), "
+                 f"previsto {plan['predicted_seconds']:.1f}s com {plan['wait_seconds']:.1f}s de fila "
+                 f"para um prazo de {latency_target:.0f}s.")
+    return job_id
+
+
+# Registra o tempo real de um trabalho concluído e recalibra o custo da opção usada (média
+# móvel exponencial que parte do custo inicial). O tempo medido é só o da síntese das partes
+# (sem fila e sem latentes). Partes lidas do cache ou reaproveitadas não medem o custo do modelo,
+# e workers em outra precisão ou com amostragem adaptativa não custam o mesmo que a opção
+# prevista, então esses trabalhos só entram no relatório de previsto x real.
+def record_job_cost(conn, job, stats, precision='fp32', adaptive=None, now=None):
+    now = time.time() if now is None else now
+    preset = job['preset']
+    candidates = job['candidates'] or PRESET_CANDIDATES.get(preset)
+    actual = stats['total_seconds']
+    report = {
+        'preset': preset,
+        'candidates': candidates,
+        'predicted_seconds': job['predicted_seconds'],
+        'actual_seconds': actual,
+        'latency_target': job['latency_target'],
+        'end_to_end_seconds': now - job['created_at'],
+    }
+    if job['latency_target'] is not None:
+        report['met_target'] = report['end_to_end_seconds'] <= job['latency_target']
+
+    cache_hits = (stats.get('cache') or {}).get('hits', 0)
+    reused = (stats.get('incremental') or {}).get('parts_reused', 0)
+    comparable = precision == 'fp32' and adaptive is None
+    if preset in PRESET_CANDIDATES and comparable and not cache_hits and not reused and job['text']:
+        observed = actual / estimate_tokens(job['text'])
+        # A primeira medição também é combinada com o custo inicial, para que um único
+        # trabalho atípico não substitua a estimativa inteira
+        first = prior_seconds_per_token(preset, candidates) * (1 - EWMA_ALPHA) + observed * EWMA_ALPHA
+        conn.execute(
+            "INSERT INTO preset_costs (preset, candidates, seconds_per_token, observations, updated_at) "
+            "VALUES (?, ?, ?, 1, ?) ON CONFLICT (preset, candidates) DO UPDATE SET "
+            "seconds_per_token = seconds_per_token * ? + ? * ?, "
+            "observations = observations + 1, updated_at = excluded.updated_at",
+            (preset, candidates, first, now, 1 - EWMA_ALPHA, observed, EWMA_ALPHA)
+        )
+        report['observed_seconds_per_token'] = observed
+    return report
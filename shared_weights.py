@@ -0,0 +1,159 @@
+import argparse
+import hashlib
+import inspect
+import logging
+import os
+from contextlib import contextmanager
+
+import torch
+
+# Diretório com os checkpoints convertidos para leitura via mmap
+SHARED_WEIGHTS_DIR = os.path.join("cache", "weights")
+
+# Checkpoints que o TextToSpeech carrega com torch.load (o CVVP só quando usado)
+TORTOISE_CHECKPOINTS = (
+    'autoregressive.pth',
+    'diffusion_decoder.pth',
+    'clvp2.pth',
+    'vocoder.pth',
+    'rlg_auto.pth',
+    'rlg_diffuser.pth',
+    'cvvp.pth',
+)
+
+# torch.load(mmap=True) e load_state_dict(assign=True) só existem a partir do torch 2.1; em versões
+# anteriores os checkpoints são carregados normalmente (cada processo com a sua cópia)
+MMAP_SUPPORTED = ('mmap' in inspect.signature(torch.load).parameters
+                  and 'assign' in inspect.signature(torch.nn.Module.load_state_dict).parameters)
+
+
+# Só tensores e contêineres simples: o arquivo convertido pode ser lido com weights_only=True
+def _tensors_only(value):
+    if isinstance(value, torch.Tensor):
+        return value.detach().contiguous()
+    if isinstance(value, dict):
+        return {k: _tensors_only(v) for k, v in value.items() if _is_plain(v)}
+    return value
+
+
+def _is_plain(value):
+    return isinstance(value, (torch.Tensor, dict, int, float, str, bool)) or value is None
+
+
+# Caminho do checkpoint convertido: o nome leva um hash do caminho do original e outro do tamanho
+# e do mtime dele, então dois models_dir com checkpoints de mesmo nome (ou um original
+# substituído) nunca se confundem
+def shared_weights_path(source_path, weights_dir=SHARED_WEIGHTS_DIR):
+    st = os.stat(source_path)
+    version = hashlib.sha256(f'{st.st_size}:{st.st_mtime_ns}'.encode('utf-8')).hexdigest()[:8]
+    return f'{_conversion_prefix(source_path, weights_dir)}{version}.pth'
+
+
+# Início do nome de todas as conversões de um mesmo arquivo original
+def _conversion_prefix(source_path, weights_dir=SHARED_WEIGHTS_DIR):
+    origin = hashlib.sha256(os.path.abspath(source_path).encode('utf-8')).hexdigest()[:8]
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(weights_dir, f'{stem}-{origin}-')
+
+
+# Converte um checkpoint do Tortoise para o formato zip do torch, que pode ser mapeado em
+# memória (torch.load(mmap=True)); escrita atômica para outros processos nunca lerem pela metade
+def convert_checkpoint(source_path, weights_dir=SHARED_WEIGHTS_DIR):
+    target_path = shared_weights_path(source_path, weights_dir)
+    if os.path.exists(target_path):
+        return target_path
+    os.makedirs(weights_dir, exist_ok=True)
+    checkpoint = torch.load(source_path, map_location='cpu')
+    tmp_path = target_path + f'.tmp{os.getpid()}'
+    torch.save(_tensors_only(checkpoint), tmp_path)
+    os.replace(tmp_path, target_path)
+    logging.info(f"Checkpoint {source_path} convertido para {target_path}.")
+    _remove_stale_conversions(source_path, target_path, weights_dir)
+    return target_path
+
+
+# Remove conversões anteriores do mesmo original (checkpoint substituído desde a última conversão)
+def _remove_stale_conversions(source_path, keep_path, weights_dir=SHARED_WEIGHTS_DIR):
+    prefix = os.path.basename(_conversion_prefix(source_path, weights_dir))
+    for f in os.listdir(weights_dir):
+        path = os.path.join(weights_dir, f)
+        if path != keep_path and f.startswith(prefix) and f.endswith('.pth'):
+            os.remove(path)
+
+
+# Converte todos os checkpoints do Tortoise (baixando os que faltarem, como o TextToSpeech faria)
+def convert_checkpoints(models_dir=None, weights_dir=SHARED_WEIGHTS_DIR):
+    from tortoise.api import MODELS_DIR, get_model_path
+
+    converted = []
+    for name in TORTOISE_CHECKPOINTS:
+        try:
+            source_path = get_model_path(name, models_dir or MODELS_DIR)
+        except Exception as e:
+            logging.warning(f"Checkpoint {name} indisponível, será carregado normalmente: {e}")
+            continue
+        converted.append(convert_checkpoint(source_path, weights_dir))
+    return converted
+
+
+# Durante o bloco, torch.load de um checkpoint já convertido devolve tensores mapeados do
+# arquivo (somente leitura, páginas compartilhadas pelo cache do sistema entre processos) e
+# load_state_dict usa esses tensores direto nos módulos (assign=True) em vez de copiá-los
+@contextmanager
+def mmap_weights(weights_dir=SHARED_WEIGHTS_DIR):
+    original_load = torch.load
+    original_load_state_dict = torch.nn.Module.load_state_dict
+    mapped = []
+
+    def load(f, *args, **kwargs):
+        if isinstance(f, (str, os.PathLike)) and os.path.exists(f):
+            shared_path = shared_weights_path(f, weights_dir)
+            if os.path.exists(shared_path):
+                checkpoint = original_load(shared_path, map_location='cpu', mmap=True, weights_only=True)
+                mapped.append(checkpoint)
+                if isinstance(checkpoint, dict):
+                    mapped.extend(v for v in checkpoint.values() if isinstance(v, dict))
+                return checkpoint
+        return original_load(f, *args, **kwargs)
+
+    def load_state_dict(self, state_dict, strict=True, assign=False):
+        if any(state_dict is m for m in mapped):
+            assign = True
+        return original_load_state_dict(self, state_dict, strict=strict, assign=assign)
+
+    torch.load = load
+    torch.nn.Module.load_state_dict = load_state_dict
+    try:
+        yield
+    finally:
+        torch.load = original_load
+        torch.nn.Module.load_state_dict = original_load_state_dict
+
+
+# Carrega o TextToSpeech com os pesos mapeados em memória (converte na primeira vez)
+def load_shared_text_to_speech(weights_dir=SHARED_WEIGHTS_DIR, **tts_kwargs):
+    from lazy_tts import load_text_to_speech
+
+    if not MMAP_SUPPORTED:
+        logging.warning(f"torch {torch.__version__} não carrega checkpoints via mmap (requer 2.1+); "
+                        f"usando o carregamento normal.")
+        return load_text_to_speech(**tts_kwargs)
+    convert_checkpoints(tts_kwargs.get('models_dir'), weights_dir)
+    with mmap_weights(weights_dir):
+        return load_text_to_speech(**tts_kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Converte os checkpoints do Tortoise para leitura via mmap, compartilhada entre processos.")
+    parser.add_argument('--models-dir', default=None, help="Pasta dos checkpoints originais do Tortoise.")
+    parser.add_argument('--output-dir', default=SHARED_WEIGHTS_DIR, help="Pasta dos checkpoints convertidos.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    converted = convert_checkpoints(args.models_dir, args.output_dir)
+    logging.info(f"{len(converted)} checkpoint(s) pronto(s) em {args.output_dir}.")
+
+
+if __name__ == '__main__':
+    main()
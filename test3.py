@@ -1,15 +1,14 @@
 import streamlit as st
-import torch
-import torchaudio
 import os
-from tortoise.api import TextToSpeech
-from tortoise.utils.audio import load_voice
-from tortoise.utils.text import split_and_recombine_text
-from time import time
+import time
 import warnings
 import logging
 
-tts = TextToSpeech()
+from jobs import (STATUS_DONE, STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING, WORKER_READY, count_queued, get_job,
+                  list_workers, submit_job)
+from scheduler import submit_scheduled_job
+from voice_registry import VoiceRegistry
+from voice_upload import UPLOAD_FAILED, UPLOAD_PREPARING, UPLOAD_PROCESSING, UPLOAD_READY, VoiceUploads
 
 # Configurar logging para depuração
 logging.basicConfig(level=logging.INFO)
@@ -25,27 +24,40 @@ st.write("""
 Esta aplicação permite selecionar uma voz personalizada, inserir um texto e gerar o áudio correspondente.
 """)
 
+# Indicador de prontidão: o modelo é carregado pelos workers, não pela página
+workers = list_workers()
+ready_workers = [w for w in workers if w['status'] == WORKER_READY]
+if ready_workers:
+    st.sidebar.success(f"Modelo pronto em {len(ready_workers)} worker(s).")
+    for w in ready_workers:
+        st.sidebar.caption(f"{w['name']}: import {w['import_seconds']:.1f}s, pesos {w['load_seconds']:.1f}s"
+                           + (f", primeira geração {w['first_request_seconds']:.1f}s" if w['first_request_seconds'] else ""))
+elif workers:
+    st.sidebar.info("Modelo carregando nos workers...")
+else:
+    st.sidebar.warning("Nenhum worker ativo. Inicie com `python jobs.py --workers N`.")
+
 # Definir o diretório base das vozes
 VOICE_BASE_DIR = "/home/lisamenezes/Searches/A03_PDSI_voice_cloning/tortoise-tts/tortoise/voices"  # Caminho relativo ao diretório atual
 os.makedirs(VOICE_BASE_DIR, exist_ok=True)  # Cria o diretório se não existir
 
-# Inicialização do Tortoise TTS com cache para melhorar desempenho
+# Registro das vozes, criado uma vez por processo: o índice em disco evita varrer as pastas a cada rerun
 @st.cache_resource
-def initialize_tts():
-    return TextToSpeech()
+def get_voice_registry():
+    return VoiceRegistry(VOICE_BASE_DIR)
 
-# tts = initialize_tts()
+voice_registry = get_voice_registry()
+
+# Envios de voz em processamento (validação e latentes em segundo plano), compartilhados entre sessões
+@st.cache_resource
+def get_voice_uploads():
+    return VoiceUploads(voice_registry)
+
+voice_uploads = get_voice_uploads()
 
 # Função para carregar vozes personalizadas mapeando nomes para nomes de pastas
 def load_custom_voices():
-    # Lista as pastas dentro do diretório base de vozes
-    available_voices = os.listdir(VOICE_BASE_DIR)
-    # Filtra apenas diretórios
-    available_voices = [voice for voice in available_voices if os.path.isdir(os.path.join(VOICE_BASE_DIR, voice))]
-    return {voice: voice for voice in available_voices}
-
-# Carregar vozes personalizadas
-voices = load_custom_voices()
+    return {voice: voice for voice in voice_registry.list_voices()}
 
 # Seção de Upload de Voz Personalizada
 st.header("Adicione uma Nova Voz Personalizada")
@@ -61,16 +73,10 @@ with st.form(key='upload_voice_form'):
         elif len(uploaded_files) != 2:
             st.error("Por favor, faça o upload exatamente de dois arquivos .wav.")
         else:
-            custom_voice_folder = os.path.join(VOICE_BASE_DIR, CUSTOM_VOICE_NAME)
-            os.makedirs(custom_voice_folder, exist_ok=True)
-            for i, file in enumerate(uploaded_files):
-                file_path = os.path.join(custom_voice_folder, f'{i}.wav')
-                with open(file_path, 'wb') as f:
-                    f.write(file.read())
-            st.success(f"Voz personalizada '{CUSTOM_VOICE_NAME}' adicionada com sucesso!")
-            logging.info(f"Voz personalizada '{CUSTOM_VOICE_NAME}' adicionada com sucesso.")
-            # Atualiza a lista de vozes disponíveis
-            voices = load_custom_voices()
+            # Validação, conversão, corte e latentes acontecem em segundo plano; o formulário retorna na hora
+            voice_uploads.start(CUSTOM_VOICE_NAME, [(file.name, file.read()) for file in uploaded_files])
+            st.info(f"Voz personalizada '{CUSTOM_VOICE_NAME}' recebida; preparando em segundo plano...")
+            logging.info(f"Voz personalizada '{CUSTOM_VOICE_NAME}' enviada para processamento.")
 
 # Seção de Seleção de Voz
 st.header("Selecione a Voz Personalizada:")
@@ -91,9 +97,71 @@ with col1:
     if st.button("Adicionar Outra Voz"):
         st.experimental_rerun()
 
+# Estado das vozes enviadas nesta execução do servidor
+UPLOAD_LABELS = {
+    UPLOAD_PROCESSING: "validando e convertendo os clipes",
+    UPLOAD_PREPARING: "calculando os latentes nos workers",
+    UPLOAD_READY: "pronta",
+}
+
+# Atualiza a lista de vozes disponíveis (vozes novas aparecem quando os clipes estão gravados)
+voices = load_custom_voices()
 for voice_name in voices.keys():
     if st.button(voice_name):
         select_voice(voice_name)
+    upload = voice_uploads.status(voice_name)
+    if upload is not None and upload['status'] != UPLOAD_FAILED:
+        st.caption(f"'{voice_name}': {UPLOAD_LABELS[upload['status']]}")
+
+upload = voice_uploads.status(CUSTOM_VOICE_NAME)
+if upload is not None and upload['status'] == UPLOAD_FAILED:
+    st.error(f"A voz '{CUSTOM_VOICE_NAME}' não pôde ser preparada: {upload['message']}")
+elif upload is not None and CUSTOM_VOICE_NAME not in voices:
+    st.caption(f"'{CUSTOM_VOICE_NAME}': {UPLOAD_LABELS[upload['status']]}")
+
+# Bytes de um arquivo de resultado, lidos do disco uma única vez por trabalho (a página é
+# reexecutada a cada segundo enquanto o trabalho anda)
+def job_audio(job, name):
+    audio_cache = st.session_state.setdefault('job_audio', {})
+    if audio_cache.get('job_id') != job['id']:
+        audio_cache.clear()
+        audio_cache['job_id'] = job['id']
+    if name not in audio_cache:
+        with open(os.path.join(job['result_dir'], f'{name}.wav'), 'rb') as f:
+            audio_cache[name] = f.read()
+    return audio_cache[name]
+
+# Função para exibir o estado de um trabalho e as partes de áudio já prontas
+def show_job(job_id):
+    job = get_job(job_id)
+    if job is None:
+        st.error("Trabalho não encontrado.")
+        return
+
+    if job['status'] == STATUS_QUEUED:
+        st.info(f"Trabalho na fila ({count_queued()} aguardando)...")
+    elif job['status'] == STATUS_RUNNING and job['parts_total']:
+        st.info(f"Gerando áudio: parte {job['parts_done']}/{job['parts_total']}...")
+        st.progress(job['parts_done'] / job['parts_total'])
+
+    # Cada parte aparece assim que o worker termina de gravá-la
+    if job['parts_done']:
+        st.subheader("Partes geradas:")
+    for j in range(job['parts_done']):
+        st.write(f"Parte {j+1}/{job['parts_total']}")
+        st.audio(job_audio(job, j), format='audio/wav')
+
+    if job['status'] == STATUS_DONE:
+        st.subheader("Áudio completo:")
+        st.audio(job_audio(job, 'combined'), format='audio/wav')
+        st.success("Áudio gerado com sucesso!")
+        st.caption(f"Estatísticas: {job['stats']}")
+    elif job['status'] == STATUS_FAILED:
+        logging.error(f"Erro na geração do áudio: {job['error']}")
+        st.error(f"Ocorreu um erro durante a geração do áudio: {job['error']}")
+    else:
+        time.sleep(1)
+        st.rerun()
 
 # Verificar se uma voz foi selecionada
 if st.session_state.selected_voice is None:
@@ -105,63 +173,38 @@ else:
                               value="""We were good, we were gold, Kind of dream that can't be sold, We were right 'til we weren't, Built a home and watched it burn""",
                               height=150)
 
-    # Botão para Gerar Áudio
+    # Semente fixa: o mesmo texto com a mesma voz reaproveita as partes já geradas (cache)
+    seed = st.number_input("Semente:", min_value=0, value=0, step=1)
+
+    # Edição de roteiro: com a mesma voz e semente, só as frases alteradas são geradas de novo
+    incremental = st.checkbox("Regerar só as partes alteradas desde a última geração", value=True)
+
+    # Com um tempo alvo, o escalonador escolhe o preset e os candidatos que cabem no prazo,
+    # considerando a fila atual; com 0, usa sempre o preset "fast"
+    latency_target = st.number_input("Tempo alvo (s, 0 = preset fast):", min_value=0, value=0, step=10)
+
+    # Botão para Gerar Áudio: a página só enfileira o trabalho; a geração acontece nos
+    # workers iniciados com `python jobs.py --workers N`
     if st.button("Gerar Áudio"):
-        with st.spinner("Gerando áudio..."):
-            try:
-                logging.info("Iniciando a geração do áudio.")
-                
-                # Preparação do Texto
-                if '|' in text_input:
-                    texts = text_input.split('|')
-                else:
-                    texts = split_and_recombine_text(text_input)
-                
-                seed = int(time())
-                
-                # Diretório para salvar os resultados
-                voice_dir = st.session_state.selected_voice.replace(' ', '_')  # Nome único baseado no nome da voz
-                outpath = os.path.join("results", "longform", voice_dir)
-                os.makedirs(outpath, exist_ok=True)
-                
-                # Carregar amostras de voz usando o nome da voz
-                voice_name = st.session_state.selected_voice
-                voice_samples, conditioning_latents = load_voice(voice_name)
-                
-                # Verificar se as amostras foram carregadas corretamente
-                if voice_samples is None or conditioning_latents is None:
-                    raise ValueError(f"Falha ao carregar a voz '{voice_name}' a partir de: {VOICE_BASE_DIR}{voice_name}/")
-                
-                all_parts = []
-                for j, text_part in enumerate(texts):
-                    gen = tts.tts_with_preset(
-                        text_part, 
-                        voice_samples=voice_samples, 
-                        conditioning_latents=conditioning_latents,
-                        preset="fast", 
-                        k=1, 
-                        use_deterministic_seed=seed
-                    )
-                    gen = gen.squeeze(0).cpu()
-                    part_path = os.path.join(outpath, f'{j}.wav')
-                    torchaudio.save(part_path, gen, 24000)
-                    all_parts.append(gen)
-                    logging.info(f"Parte {j} do áudio gerada e salva em {part_path}.")
-                
-                # Concatenar todas as partes em um único áudio
-                full_audio = torch.cat(all_parts, dim=-1)
-                combined_path = os.path.join(outpath, 'combined.wav')
-                torchaudio.save(combined_path, full_audio, 24000)
-                logging.info(f"Áudio combinado salvo em {combined_path}.")
-                
-                # Reproduzir o áudio gerado diretamente no Streamlit
-                with open(combined_path, 'rb') as f:
-                    audio_bytes = f.read()
-                
-                st.audio(audio_bytes, format='audio/wav')
-                st.success("Áudio gerado com sucesso!")
-                logging.info("Áudio gerado e reproduzido com sucesso.")
-            
-            except Exception as e:
-                logging.error(f"Erro na geração do áudio: {e}")
-                st.error(f"Ocorreu um erro durante a geração do áudio: {e}")
+        voice_name = st.session_state.selected_voice
+        voice_dir = os.path.join(VOICE_BASE_DIR, voice_name)
+        if latency_target:
+            st.session_state.job_id = submit_scheduled_job(voice_name, voice_dir, text_input, latency_target,
+                                                           seed=int(seed), incremental=incremental)
+        else:
+            st.session_state.job_id = submit_job(voice_name, voice_dir, text_input, preset="fast", seed=int(seed),
+                                                 incremental=incremental)
+        logging.info(f"Trabalho {st.session_state.job_id} enviado para a voz '{voice_name}'.")
+
+    # Acompanhar o trabalho enviado, consultando a fila a cada segundo
+    if st.session_state.get('job_id'):
+        show_job(st.session_state.job_id)
+
+# Enquanto uma voz enviada estiver sendo preparada, a página se atualiza para mostrar o estado
+# (show_job já reinicia a página por conta própria enquanto o trabalho não termina). Sem worker
+# pronto os latentes não andam, e uma voz parada há mais de UPLOAD_POLL_TIMEOUT segundos deixa de
+# atualizar a página sozinha (o estado volta a ser consultado no próximo clique).
+UPLOAD_POLL_TIMEOUT = 600
+if voice_uploads.pending(max_age=UPLOAD_POLL_TIMEOUT, workers_ready=bool(ready_workers)):
+    time.sleep(1)
+    st.rerun()
@@ -0,0 +1,21 @@
+from adaptive_sampling import AdaptiveSampling
+
+
+def test_budget_scales_with_text_length():
+    adaptive = AdaptiveSampling()
+    assert adaptive.budget('x' * 200, 96, 4) == 96
+    assert adaptive.budget('x' * 400, 96, 4) == 96
+    assert adaptive.budget('x' * 50, 96, 4) == 24
+
+
+def test_budget_rounds_up_to_batch_and_respects_minimum():
+    adaptive = AdaptiveSampling()
+    assert adaptive.budget('x' * 30, 96, 4) == 16
+    assert adaptive.budget('x' * 5, 96, 4) == 8
+    assert adaptive.budget('x' * 5, 96, 16) == 16
+
+
+def test_budget_never_exceeds_preset():
+    adaptive = AdaptiveSampling(min_candidates=32)
+    assert adaptive.budget('x' * 10, 16, 4) == 16
+    assert adaptive.budget('x' * 200, 10, 4) == 8
@@ -0,0 +1,24 @@
+import numpy as np
+
+from audio_sink import SAMPLE_RATE, encode_wav, read_wav, read_wav_pcm
+
+
+def test_encode_wav_round_trip(tmp_path):
+    samples = np.linspace(-1.0, 1.0, 1001, dtype=np.float32).reshape(1, -1)
+    path = tmp_path / 'part.wav'
+    path.write_bytes(encode_wav(samples, SAMPLE_RATE))
+
+    num_channels, sample_rate, pcm = read_wav_pcm(str(path))
+    assert (num_channels, sample_rate) == (1, SAMPLE_RATE)
+    assert np.array_equal(np.frombuffer(pcm, dtype='<i2'), (samples[0] * 32767).astype(np.int16))
+    assert np.allclose(read_wav(str(path)), samples, atol=1 / 32767)
+
+
+def test_encode_wav_keeps_int16_and_clips_float(tmp_path):
+    pcm16 = np.array([[-32768, -1, 0, 1, 32767]], dtype=np.int16)
+    path = tmp_path / 'int16.wav'
+    path.write_bytes(encode_wav(pcm16))
+    assert np.array_equal(np.frombuffer(read_wav_pcm(str(path))[2], dtype='<i2'), pcm16[0])
+
+    path.write_bytes(encode_wav(np.array([[-2.0, 2.0]], dtype=np.float16)))
+    assert np.frombuffer(read_wav_pcm(str(path))[2], dtype='<i2').tolist() == [-32767, 32767]
@@ -0,0 +1,60 @@
+from chunker import MAX_CHUNK_CHARS, TARGET_CHUNK_CHARS, plan_chunks, plan_incremental, split_sentences
+
+SENTENCES = [f'Sentence number {i} says something moderately long about topic {i}.' for i in range(24)]
+
+
+def test_split_sentences_keeps_closing_quotes_and_brackets():
+    text = '"Quoted sentence." Next one! (An aside.) [Bracketed?] \'Single.\' Last'
+    assert split_sentences(text) == [
+        '"Quoted sentence."', 'Next one!', '(An aside.)', '[Bracketed?]', "'Single.'", 'Last',
+    ]
+
+
+def test_split_sentences_on_blank_lines_and_ellipsis():
+    assert split_sentences('Wait... what?\n\nNew paragraph') == ['Wait...', 'what?', 'New paragraph']
+
+
+def test_plan_chunks_preserves_text():
+    text = '"Quoted sentence." Next one! (An aside.) ' * 20
+    chunks = plan_chunks(text)
+    assert ' '.join(chunks) == ' '.join(text.split())
+
+
+def test_plan_chunks_targets_200_chars_with_one_worker():
+    text = 'A short sentence of moderate length, with a clause. ' * 40
+    chunks = plan_chunks(text, workers=1)
+    assert len(chunks) > 1
+    assert all(len(c) <= TARGET_CHUNK_CHARS for c in chunks)
+
+
+def test_plan_chunks_keeps_long_sentence_up_to_hard_cap():
+    sentence = ('word ' * 50).strip() + '.'
+    assert TARGET_CHUNK_CHARS < len(sentence) <= MAX_CHUNK_CHARS
+    assert plan_chunks(sentence) == (sentence,)
+
+
+def test_plan_incremental_reuses_unchanged_chunks():
+    previous = plan_chunks(' '.join(SENTENCES))
+    chunks, reused = plan_incremental(previous, ' '.join(SENTENCES))
+    assert chunks == list(previous)
+    assert reused == list(range(len(previous)))
+
+
+def test_plan_incremental_replans_only_edited_chunk():
+    previous = plan_chunks(' '.join(SENTENCES))
+    edited = list(SENTENCES)
+    edited[10] = 'This sentence was rewritten completely.'
+    chunks, reused = plan_incremental(previous, ' '.join(edited))
+    changed = [j for j, i in enumerate(reused) if i is None]
+    assert len(changed) == 1 and 'rewritten' in chunks[changed[0]]
+    assert [i for i in reused if i is not None] == [i for i in range(len(previous)) if i != changed[0]]
+    assert all(chunks[j] == previous[i] for j, i in enumerate(reused) if i is not None)
+    assert ' '.join(chunks) == ' '.join(edited)
+
+
+def test_plan_incremental_insertion_keeps_later_chunks():
+    previous = plan_chunks(' '.join(SENTENCES))
+    chunks, reused = plan_incremental(previous, ' '.join(SENTENCES[:5] + ['A brand new sentence.'] + SENTENCES[5:]))
+    assert reused[0] == 0
+    assert reused[-(len(previous) - 2):] == list(range(2, len(previous)))
+    assert 'A brand new sentence.' in ' '.join(c for c, i in zip(chunks, reused) if i is None)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('librosa')
+
+from ingest_voices import TARGET_SAMPLE_RATE, split_segments  # noqa: E402
+
+
+# Áudio com tons nos intervalos dados (em segundos) e silêncio absoluto no resto
+def _bursts(intervals, total_seconds):
+    audio = np.zeros(int(total_seconds * TARGET_SAMPLE_RATE), dtype=np.float32)
+    for start, end in intervals:
+        t = np.arange(int(start * TARGET_SAMPLE_RATE), int(end * TARGET_SAMPLE_RATE))
+        audio[t] = 0.5 * np.sin(2 * np.pi * 220 * t / TARGET_SAMPLE_RATE)
+    return audio
+
+
+def _durations(segments):
+    return [len(s) / TARGET_SAMPLE_RATE for s in segments]
+
+
+def test_split_segments_packs_intervals_with_short_gaps():
+    audio = _bursts([(0, 3), (3.2, 6), (6.1, 9), (9.3, 13), (13.2, 16)], 17)
+    durations = _durations(split_segments(audio))
+    assert len(durations) == 2
+    assert all(6 <= d <= 10 for d in durations)
+    assert sum(durations) >= 15.5
+
+
+def test_split_segments_never_bridges_long_silences():
+    audio = _bursts([(0, 4), (7, 11)], 12)
+    assert split_segments(audio) == []
+
+
+def test_split_segments_splits_only_long_intervals():
+    audio = _bursts([(0, 25)], 26)
+    durations = _durations(split_segments(audio))
+    assert len(durations) == 3
+    assert all(6 <= d <= 10 for d in durations)
@@ -0,0 +1,40 @@
+import os
+
+import jobs
+
+
+def _finish(conn, job_id, result_dir, finished_at, status=jobs.STATUS_DONE):
+    os.makedirs(result_dir, exist_ok=True)
+    conn.execute("UPDATE jobs SET status = ?, result_dir = ?, finished_at = ? WHERE id = ?",
+                 (status, result_dir, finished_at, job_id))
+
+
+def test_prune_jobs_keeps_newest_per_voice_preset_seed(tmp_path):
+    db = str(tmp_path / 'jobs.sqlite3')
+    conn = jobs.connect(db)
+    done = []
+    for i in range(jobs.JOBS_KEEP_PER_KEY + 2):
+        job_id = jobs.submit_job('voice', 'voice_dir', 'text', 'fast', 1, db_path=db)
+        _finish(conn, job_id, str(tmp_path / job_id), 1000 + i)
+        done.append(job_id)
+    other = jobs.submit_job('voice', 'voice_dir', 'text', 'fast', 2, db_path=db)
+    _finish(conn, other, str(tmp_path / other), 1000)
+    queued = jobs.submit_job('voice', 'voice_dir', 'text', 'fast', 1, db_path=db)
+
+    assert jobs.prune_jobs(db, now=2000) == 2
+    remaining = {row['id'] for row in conn.execute("SELECT id FROM jobs")}
+    assert remaining == set(done[2:]) | {other, queued}
+    assert not any(os.path.exists(tmp_path / job_id) for job_id in done[:2])
+    assert all(os.path.exists(tmp_path / job_id) for job_id in done[2:])
+
+
+def test_prune_jobs_drops_jobs_past_retention(tmp_path):
+    db = str(tmp_path / 'jobs.sqlite3')
+    conn = jobs.connect(db)
+    job_id = jobs.submit_job('voice', 'voice_dir', 'text', 'fast', 1, db_path=db)
+    _finish(conn, job_id, str(tmp_path / job_id), 1000)
+
+    assert jobs.prune_jobs(db, now=1000 + jobs.JOBS_RETENTION_SECONDS - 1) == 0
+    assert jobs.prune_jobs(db, now=1001 + jobs.JOBS_RETENTION_SECONDS) == 1
+    assert jobs.get_job(job_id, db) is None
+    assert not os.path.exists(tmp_path / job_id)
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from benchmark import StubTextToSpeech  # noqa: E402
+from longform import SAMPLES_PER_CHAR, LongformAssembler, iter_longform  # noqa: E402
+from result_cache import ResultCache  # noqa: E402
+
+TEXTS = ['First part of the text.', 'A second, somewhat longer part of the same text.', 'Last.']
+
+
+def _stub():
+    tts = StubTextToSpeech()
+    return tts, tts.get_conditioning_latents([torch.zeros(1, 22050)])
+
+
+def test_iter_longform_batch_1_matches_original_loop():
+    tts, latents = _stub()
+    parts = list(iter_longform(tts, TEXTS, latents, preset='ultra_fast', seed=3, batch_size=None))
+    expected = [tts.tts_with_preset(text, voice_samples=None, conditioning_latents=latents, preset='ultra_fast',
+                                    k=1, use_deterministic_seed=3).squeeze(0).cpu()
+                for text in TEXTS]
+    assert [j for j, _ in parts] == list(range(len(TEXTS)))
+    for (_, gen), reference in zip(parts, expected):
+        assert torch.equal(gen, reference)
+
+
+def test_iter_longform_yields_parts_in_text_order():
+    tts, latents = _stub()
+    parts = list(iter_longform(tts, TEXTS, latents, preset='ultra_fast', seed=0))
+    assert [j for j, _ in parts] == list(range(len(TEXTS)))
+    assert [gen.shape[-1] for _, gen in parts] == [len(text) * SAMPLES_PER_CHAR for text in TEXTS]
+
+
+def test_iter_longform_reads_repeated_parts_from_cache(tmp_path):
+    tts, latents = _stub()
+    cache = ResultCache(str(tmp_path))
+    first = list(iter_longform(tts, TEXTS, latents, preset='ultra_fast', seed=3, cache=cache, voice_hash='voice'))
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (0, len(TEXTS))
+
+    calls = []
+    synthesize = tts.tts_with_preset
+    tts.tts_with_preset = lambda *args, **kwargs: calls.append(args) or synthesize(*args, **kwargs)
+    second = list(iter_longform(tts, TEXTS, latents, preset='ultra_fast', seed=3, cache=cache, voice_hash='voice'))
+    assert calls == []
+    assert cache.stats()['hits'] == len(TEXTS)
+    assert [j for j, _ in second] == list(range(len(TEXTS)))
+    for (_, cached), (_, generated) in zip(second, first):
+        assert torch.equal(cached, generated)
+
+
+def test_iter_longform_without_seed_skips_cache(tmp_path):
+    tts, latents = _stub()
+    cache = ResultCache(str(tmp_path))
+    list(iter_longform(tts, TEXTS, latents, preset='ultra_fast', cache=cache, voice_hash='voice'))
+    assert cache.stats()['misses'] == 0 and cache.stats()['size_bytes'] == 0
+
+
+def test_assembler_grows_past_estimate():
+    parts = [np.full(8, i, dtype=np.float32) / 10 for i in range(3)]
+    assembler = LongformAssembler(10)
+    bounds = [assembler.append(part) for part in parts]
+    assert bounds == [(0, 8), (8, 16), (16, 24)]
+    assert np.array_equal(assembler.result(), np.concatenate(parts).reshape(1, -1))
+    stats = assembler.stats()
+    assert stats['samples'] == 24 and stats['capacity'] >= 24
+    assert stats['peak_buffer_bytes'] > stats['capacity'] * 4
+
+
+def test_assembler_crossfades_seam():
+    assembler = LongformAssembler(200)
+    assembler.append(torch.full((1, 100), 0.5))
+    assert assembler.append(torch.full((1, 100), -0.5), crossfade=10) == (90, 190)
+    audio = assembler.result()[0]
+    assert len(audio) == 190
+    assert audio[90] == pytest.approx(0.5)
+    assert audio[99] == pytest.approx(-0.5)
+    assert np.all(np.diff(audio[90:100]) < 0)
+    assert np.all(audio[100:] == -0.5)
+
+
+def test_assembler_int16_storage():
+    assembler = LongformAssembler(5, storage='int16')
+    assembler.append(np.array([-2.0, -0.5, 0.0, 0.5, 2.0], dtype=np.float32))
+    audio = assembler.result()
+    assert audio.dtype == np.int16
+    assert audio[0].tolist() == [-32767, -16383, 0, 16383, 32767]
+    assert assembler.stats()['storage'] == 'int16'
+    with pytest.raises(ValueError):
+        LongformAssembler(5, storage='int8')
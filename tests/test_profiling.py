@@ -0,0 +1,19 @@
+import json
+
+from profiling import Profiler, stage
+
+
+def test_write_events_aggregates_per_stage_and_chunk(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    profiler = Profiler('job', events_path=str(path))
+    with profiler.activate():
+        for chunk in range(2):
+            with stage('chunk', chunk=chunk):
+                for _ in range(50):
+                    with stage('autoregressive'):
+                        pass
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(r['stage'], r.get('chunk'), r.get('count')) for r in records[:-1]] == [
+        ('autoregressive', 0, 50), ('chunk', 0, 1), ('autoregressive', 1, 50), ('chunk', 1, 1),
+    ]
+    assert records[-1]['summary']['stages']['autoregressive']['count'] == 100
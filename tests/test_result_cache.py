@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+
+from result_cache import ResultCache, chunk_key
+
+
+def _key(name):
+    return chunk_key('voice', name, 'fast', 1, 0, 1)
+
+
+def _fill(cache, names):
+    for i, name in enumerate(names):
+        cache.put(_key(name), np.zeros(100, dtype=np.float32))
+        os.utime(cache._path(_key(name)), (1000 + i, 1000 + i))
+    return os.path.getsize(cache._path(_key(names[0])))
+
+
+def test_get_marks_entry_as_recently_used(tmp_path):
+    size = _fill(ResultCache(str(tmp_path)), ['a', 'b', 'c'])
+    cache = ResultCache(str(tmp_path), max_bytes=int(size * 2.5))
+    assert cache.get(_key('a')) is not None
+
+    cache.evict()
+    assert cache.get(_key('b')) is None
+    assert cache.get(_key('a')) is not None and cache.get(_key('c')) is not None
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['size_bytes'] == 2 * size
+
+
+def test_evict_trims_to_low_water_mark(tmp_path):
+    names = [str(i) for i in range(10)]
+    size = _fill(ResultCache(str(tmp_path)), names)
+    cache = ResultCache(str(tmp_path), max_bytes=int(size * 9.5), low_water=0.9)
+
+    cache.evict()
+    kept = [name for name in names if os.path.exists(cache._path(_key(name)))]
+    assert kept == names[2:]
+    assert cache.stats()['size_bytes'] == 8 * size <= cache.low_water_bytes
+
+
+def test_evict_does_nothing_under_the_limit(tmp_path):
+    size = _fill(ResultCache(str(tmp_path)), ['a', 'b'])
+    cache = ResultCache(str(tmp_path), max_bytes=size * 2)
+    cache.evict()
+    assert cache.stats()['evictions'] == 0
+    assert cache.get(_key('a')) is not None and cache.get(_key('b')) is not None
@@ -0,0 +1,63 @@
+import pytest
+
+import jobs
+import scheduler
+from chunker import estimate_tokens
+
+TEXT = 'word ' * 60
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'jobs.sqlite3')
+
+
+def _job(db, preset='fast', candidates=None):
+    job_id = jobs.submit_job('voice', 'voice_dir', TEXT, preset, 0, db_path=db, candidates=candidates)
+    return jobs.get_job(job_id, db)
+
+
+def test_choose_preset_picks_best_option_within_deadline(db):
+    assert scheduler.choose_preset(TEXT, 10000, db)['preset'] == 'standard'
+    plan = scheduler.choose_preset(TEXT, 200, db)
+    assert (plan['preset'], plan['candidates']) == ('fast', None)
+    assert plan['predicted_seconds'] <= 200 * scheduler.DEADLINE_MARGIN
+
+
+def test_choose_preset_falls_back_to_cheapest_option(db):
+    plan = scheduler.choose_preset(TEXT, 1, db)
+    assert (plan['preset'], plan['candidates']) == scheduler.schedule_options()[-1]
+
+
+def test_choose_preset_counts_queue_wait(db):
+    assert scheduler.choose_preset(TEXT, 1000, db)['preset'] == 'standard'
+    for _ in range(3):
+        jobs.submit_job('voice', 'voice_dir', TEXT, 'standard', 0, db_path=db)
+    plan = scheduler.choose_preset(TEXT, 1000, db)
+    assert plan['wait_seconds'] == pytest.approx(3 * scheduler.predict_seconds({}, TEXT, 'standard'))
+    assert plan['preset'] != 'standard'
+
+
+def test_record_job_cost_blends_observations_with_prior(db):
+    conn = jobs.connect(db)
+    job = _job(db)
+    prior = scheduler.prior_seconds_per_token('fast', 96)
+    observed = 100.0 / estimate_tokens(TEXT)
+
+    report = scheduler.record_job_cost(conn, job, {'total_seconds': 100.0})
+    assert report['observed_seconds_per_token'] == pytest.approx(observed)
+    first = prior * (1 - scheduler.EWMA_ALPHA) + observed * scheduler.EWMA_ALPHA
+    assert scheduler.load_costs(conn)[('fast', 96)] == pytest.approx(first)
+
+    scheduler.record_job_cost(conn, job, {'total_seconds': 100.0})
+    second = first * (1 - scheduler.EWMA_ALPHA) + observed * scheduler.EWMA_ALPHA
+    assert scheduler.load_costs(conn)[('fast', 96)] == pytest.approx(second)
+
+
+def test_record_job_cost_skips_runs_that_do_not_measure_the_model(db):
+    conn = jobs.connect(db)
+    job = _job(db)
+    scheduler.record_job_cost(conn, job, {'total_seconds': 1.0, 'cache': {'hits': 1}})
+    scheduler.record_job_cost(conn, job, {'total_seconds': 1.0, 'incremental': {'parts_reused': 2}})
+    scheduler.record_job_cost(conn, job, {'total_seconds': 1.0}, precision='int8')
+    assert conn.execute("SELECT COUNT(*) FROM preset_costs").fetchone()[0] == 0
@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+from profiling import stage
+
+# Diretório onde os latentes de condicionamento já calculados são guardados
+LATENT_CACHE_DIR = os.path.join("cache", "latents")
+
+# Extensões aceitas como clipes de referência (as mesmas que o load_voice do Tortoise)
+VOICE_EXTENSIONS = ('.wav', '.mp3')
+
+# Taxa de amostragem esperada pelo Tortoise para os clipes de condicionamento
+CONDITIONING_SAMPLE_RATE = 22050
+
+# Memória do processo para evitar reler arquivos que não mudaram
+_hash_memo = {}
+_latent_memo = {}
+
+
+# Função para listar os clipes de referência de uma voz em ordem estável
+def list_voice_clips(voice_dir):
+    return sorted(
+        os.path.join(voice_dir, f) for f in os.listdir(voice_dir)
+        if f.lower().endswith(VOICE_EXTENSIONS)
+    )
+
+
+# Função para calcular o hash do conteúdo dos clipes de uma voz
+def hash_voice_clips(clip_paths):
+    # A chave da memória inclui mtime e tamanho, então qualquer alteração força um novo hash
+    stats = tuple((p, st.st_mtime_ns, st.st_size) for p, st in ((p, os.stat(p)) for p in clip_paths))
+    if stats in _hash_memo:
+        return _hash_memo[stats]
+
+    digest = hashlib.sha256()
+    for path in clip_paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    _hash_memo[stats] = digest.hexdigest()
+    return _hash_memo[stats]
+
+
+# Hash do conteúdo atual de uma voz (identifica os latentes e os resultados gerados com ela)
+def voice_content_hash(voice_dir):
+    return hash_voice_clips(list_voice_clips(voice_dir))
+
+
+# Caminho do arquivo de cache para uma voz, um hash de conteúdo e um modo de inferência
+# (os latentes do int8 e do bf16 saem dos módulos convertidos; o fp32 mantém o nome original)
+def latent_cache_path(voice_name, digest, cache_dir=LATENT_CACHE_DIR, precision='fp32'):
+    suffix = '' if precision == 'fp32' else f'-{precision}'
+    return os.path.join(cache_dir, voice_name, f'{digest}{suffix}.pth')
+
+
+# Modo de inferência de um arquivo de latentes (o inverso do sufixo de latent_cache_path)
+def _latent_precision(file_name):
+    stem = file_name[:-len('.pth')]
+    return stem.split('-', 1)[1] if '-' in stem else 'fp32'
+
+
+# Remove entradas antigas da mesma voz e do mesmo modo (clipes que já foram alterados)
+def _remove_stale_latents(voice_name, keep_path, cache_dir=LATENT_CACHE_DIR, precision='fp32'):
+    voice_cache_dir = os.path.join(cache_dir, voice_name)
+    for f in os.listdir(voice_cache_dir):
+        path = os.path.join(voice_cache_dir, f)
+        if path != keep_path and f.endswith('.pth') and _latent_precision(f) == precision:
+            os.remove(path)
+            _latent_memo.pop(path, None)
+
+
+# Função principal: devolve os latentes de condicionamento da voz, calculando apenas uma vez
+# por conteúdo de clipes. O resultado pode ser passado direto como `conditioning_latents`
+# para `tts_with_preset` (com `voice_samples=None`).
+def get_conditioning_latents(tts, voice_name, voice_dir, cache_dir=LATENT_CACHE_DIR):
+    # torch e Tortoise só aqui: a interface usa o hash e o caminho do cache sem carregá-los
+    import torch
+    from tortoise.utils.audio import load_audio
+
+    clips = list_voice_clips(voice_dir)
+    if not clips:
+        raise ValueError(f"Nenhum clipe de referência encontrado em {voice_dir}")
+
+    with stage('voice_hash'):
+        digest = hash_voice_clips(clips)
+    precision = getattr(tts, 'inference_precision', 'fp32')
+    cache_path = latent_cache_path(voice_name, digest, cache_dir, precision)
+
+    if cache_path in _latent_memo:
+        return _latent_memo[cache_path]
+
+    if os.path.exists(cache_path):
+        logging.info(f"Latentes da voz '{voice_name}' carregados do cache {cache_path}.")
+        latents = torch.load(cache_path, map_location='cpu')
+    else:
+        logging.info(f"Calculando latentes de condicionamento da voz '{voice_name}'.")
+        with stage('voice_load'):
+            voice_samples = [load_audio(p, CONDITIONING_SAMPLE_RATE) for p in clips]
+        with stage('latents'), torch.no_grad():
+            latents = tuple(l.cpu() for l in tts.get_conditioning_latents(voice_samples))
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Escrita atômica para que outro processo nunca leia um arquivo pela metade; o nome
+        # temporário é único, já que vários workers podem calcular a mesma voz ao mesmo tempo
+        fd, tmp_path = tempfile.mkstemp(prefix=f'{digest}.', suffix='.tmp', dir=os.path.dirname(cache_path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                torch.save(latents, f)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        _remove_stale_latents(voice_name, cache_path, cache_dir, precision)
+        logging.info(f"Latentes da voz '{voice_name}' salvos em {cache_path}.")
+
+    _latent_memo[cache_path] = latents
+    return latents
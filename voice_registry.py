@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from voice_cache import LATENT_CACHE_DIR, hash_voice_clips, latent_cache_path, list_voice_clips
+
+# Pasta dos índices das vozes (fora da pasta de vozes, para não alterar o mtime dela ao salvar)
+VOICE_INDEX_DIR = "cache"
+
+
+# Um índice por pasta base: registros de pastas diferentes (UI, API, ingestão) no mesmo
+# diretório de trabalho não apagam o índice um do outro
+def voice_index_path(base_dir, index_dir=VOICE_INDEX_DIR):
+    digest = hashlib.sha256(os.path.abspath(base_dir).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(index_dir, f'voice_index-{digest}.json')
+
+
+# Duração e taxa de amostragem lidas só do cabeçalho do arquivo (sem decodificar o áudio)
+def clip_info(path):
+    import soundfile as sf
+
+    try:
+        info = sf.info(path)
+    except RuntimeError:
+        return None, None
+    return info.duration, info.samplerate
+
+
+# Registro das vozes com índice em disco. A lista de vozes só é refeita quando o mtime da
+# pasta base muda (voz criada ou removida); os dados de cada voz só são relidos quando a
+# pasta ou algum clipe dela mudou. Nada é lido antes do primeiro uso.
+class VoiceRegistry:
+    def __init__(self, base_dir, index_path=None, latent_dir=LATENT_CACHE_DIR):
+        self.base_dir = base_dir
+        self.index_path = index_path or voice_index_path(base_dir)
+        self.latent_dir = latent_dir
+        self._index = None
+        self._names = None
+        self._lock = threading.RLock()
+
+    def _load_index(self):
+        if self._index is not None:
+            return self._index
+        index = None
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+            except ValueError:
+                logging.warning(f"Índice de vozes corrompido em {self.index_path}; será refeito.")
+        if not index or index.get('base_dir') != os.path.abspath(self.base_dir):
+            index = {'base_dir': os.path.abspath(self.base_dir), 'base_mtime_ns': None, 'voices': {}}
+        self._index = index
+        return index
+
+    def _save_index(self):
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        tmp_path = self.index_path + f'.tmp{os.getpid()}'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+
+    # Lê os clipes de uma voz e monta a entrada do índice
+    def _scan_voice(self, name):
+        voice_dir = os.path.join(self.base_dir, name)
+        clips = []
+        for path in list_voice_clips(voice_dir):
+            st = os.stat(path)
+            duration, sample_rate = clip_info(path)
+            clips.append({'path': path, 'mtime_ns': st.st_mtime_ns, 'size': st.st_size,
+                          'duration': duration, 'sample_rate': sample_rate})
+        digest = hash_voice_clips([c['path'] for c in clips]) if clips else None
+        return {
+            'name': name,
+            'dir': voice_dir,
+            'dir_mtime_ns': os.stat(voice_dir).st_mtime_ns,
+            'clips': clips,
+            'hash': digest,
+            'latent_path': latent_cache_path(name, digest, self.latent_dir) if digest else None,
+        }
+
+    # A entrada ainda corresponde aos arquivos? (só stat, nenhum arquivo é lido)
+    def _is_fresh(self, entry):
+        try:
+            if os.stat(entry['dir']).st_mtime_ns != entry['dir_mtime_ns']:
+                return False
+            for clip in entry['clips']:
+                st = os.stat(clip['path'])
+                if (st.st_mtime_ns, st.st_size) != (clip['mtime_ns'], clip['size']):
+                    return False
+        except FileNotFoundError:
+            return False
+        return True
+
+    # Nomes das vozes em ordem. Com a pasta base inalterada custa um único stat.
+    def list_voices(self):
+        with self._lock:
+            index = self._load_index()
+            base_mtime_ns = os.stat(self.base_dir).st_mtime_ns
+            if self._names is not None and index['base_mtime_ns'] == base_mtime_ns:
+                return self._names
+            if index['base_mtime_ns'] != base_mtime_ns:
+                # Pastas ocultas são temporárias (clipes de uma voz sendo substituídos)
+                names = {f for f in os.listdir(self.base_dir)
+                         if not f.startswith('.') and os.path.isdir(os.path.join(self.base_dir, f))}
+                voices = index['voices']
+                for name in set(voices) - names:
+                    del voices[name]
+                # Vozes novas entram sem dados; os clipes são lidos no primeiro get()
+                for name in names - set(voices):
+                    voices[name] = None
+                index['base_mtime_ns'] = base_mtime_ns
+                self._save_index()
+            self._names = sorted(index['voices'])
+            return self._names
+
+    # Dados de uma voz (clipes, duração, taxa, hash e latentes), relidos só se algo mudou
+    def get(self, name):
+        with self._lock:
+            voices = self._load_index()['voices']
+            if name not in voices and name not in self.list_voices():
+                return None
+            entry = voices.get(name)
+            if entry is None or not self._is_fresh(entry):
+                entry = self.update_voice(name)
+            return entry
+
+    # Relê uma voz e atualiza o índice (chamado depois que o formulário grava clipes novos)
+    def update_voice(self, name):
+        with self._lock:
+            index = self._load_index()
+            voice_dir = os.path.join(self.base_dir, name)
+            if not os.path.isdir(voice_dir):
+                index['voices'].pop(name, None)
+                entry = None
+            else:
+                entry = self._scan_voice(name)
+                index['voices'][name] = entry
+            self._names = None
+            self._save_index()
+            return entry
@@ -0,0 +1,145 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from ingest_voices import MAX_SEGMENT_SECONDS, SILENCE_TOP_DB, TARGET_SAMPLE_RATE, load_mono, split_segments
+from jobs import JOBS_DB_PATH, STATUS_DONE, STATUS_FAILED, get_job, submit_voice_preparation
+
+# Estados de uma voz enviada pelo formulário
+UPLOAD_PROCESSING = 'processing'
+UPLOAD_PREPARING = 'preparing'
+UPLOAD_READY = 'ready'
+UPLOAD_FAILED = 'failed'
+
+# Clipes mais curtos que isso (depois de cortar o silêncio) não servem de referência
+MIN_CLIP_SECONDS = 2
+
+
+# Decodifica, converte para mono 22,05 kHz, corta o silêncio das pontas e normaliza um clipe.
+# Clipes longos são divididos em segmentos de até 10 s, como na ingestão em lote.
+def preprocess_clip(path):
+    import librosa
+
+    try:
+        audio = load_mono(path)
+    except Exception as e:
+        raise ValueError(f"{os.path.basename(path)}: não foi possível decodificar o áudio ({e}).")
+    audio, _ = librosa.effects.trim(audio, top_db=SILENCE_TOP_DB)
+    peak = np.abs(audio).max() if audio.size else 0.0
+    if peak == 0:
+        raise ValueError(f"{os.path.basename(path)}: o áudio está em silêncio.")
+    if len(audio) < MIN_CLIP_SECONDS * TARGET_SAMPLE_RATE:
+        raise ValueError(f"{os.path.basename(path)}: menos de {MIN_CLIP_SECONDS} s de fala.")
+    audio = audio * (0.89 / peak)
+    if len(audio) <= MAX_SEGMENT_SECONDS * TARGET_SAMPLE_RATE:
+        return [audio]
+    return split_segments(audio) or [audio[:MAX_SEGMENT_SECONDS * TARGET_SAMPLE_RATE]]
+
+
+# Envios de voz processados em segundo plano: o formulário retorna na hora e a UI consulta
+# o estado de cada voz (processando, preparando latentes nos workers, pronta ou com erro)
+class VoiceUploads:
+    def __init__(self, registry, db_path=JOBS_DB_PATH):
+        self.registry = registry
+        self.db_path = db_path
+        self._status = {}
+        self._lock = threading.Lock()
+
+    def _set(self, voice_name, **fields):
+        with self._lock:
+            self._status[voice_name] = {**self._status.get(voice_name, {}), **fields, 'updated_at': time.time()}
+
+    # Recebe os arquivos já lidos do formulário [(nome, bytes)] e processa em uma thread
+    def start(self, voice_name, files):
+        self._set(voice_name, status=UPLOAD_PROCESSING, message=None, job_id=None)
+        threading.Thread(target=self._process, args=(voice_name, files),
+                         name=f'voice-upload-{voice_name}', daemon=True).start()
+
+    def _process(self, voice_name, files):
+        voice_dir = os.path.join(self.registry.base_dir, voice_name)
+        try:
+            clips = []
+            with tempfile.TemporaryDirectory(prefix='voice-upload-') as work_dir:
+                for file_name, data in files:
+                    path = os.path.join(work_dir, os.path.basename(file_name))
+                    with open(path, 'wb') as f:
+                        f.write(data)
+                    clips.extend(preprocess_clip(path))
+            self._write_clips(voice_dir, clips)
+            self.registry.update_voice(voice_name)
+            logging.info(f"Voz '{voice_name}': {len(clips)} clipe(s) validado(s); calculando latentes.")
+            job_id = submit_voice_preparation(voice_name, voice_dir, self.db_path)
+            self._set(voice_name, status=UPLOAD_PREPARING, job_id=job_id)
+        except Exception as e:
+            logging.error(f"Erro ao processar a voz '{voice_name}': {e}")
+            self._set(voice_name, status=UPLOAD_FAILED, message=str(e))
+
+    # Substitui os clipes da voz pelos processados (PCM 16 bits, 22,05 kHz). Os clipes são gravados
+    # em uma pasta temporária ao lado da voz, que toma o lugar dela só no fim: quem lê a voz (latentes,
+    # workers) nunca vê uma mistura de clipes antigos e novos, e um erro no meio mantém a voz antiga.
+    def _write_clips(self, voice_dir, clips):
+        import soundfile as sf
+
+        base_dir = os.path.dirname(voice_dir) or '.'
+        os.makedirs(base_dir, exist_ok=True)
+        # Pastas ocultas não aparecem como vozes no registro
+        new_dir = tempfile.mkdtemp(prefix=f'.{os.path.basename(voice_dir)}-new-', dir=base_dir)
+        try:
+            for i, clip in enumerate(clips):
+                sf.write(os.path.join(new_dir, f'{i}.wav'), clip, TARGET_SAMPLE_RATE, subtype='PCM_16')
+            # mkdtemp cria a pasta só para o dono; a voz mantém as permissões de uma pasta comum
+            os.chmod(new_dir, 0o755)
+            if not os.path.isdir(voice_dir):
+                os.replace(new_dir, voice_dir)
+                return
+            # Outros arquivos da pasta (que não são clipes) continuam na voz
+            for f in os.listdir(voice_dir):
+                path = os.path.join(voice_dir, f)
+                if os.path.isfile(path) and not f.lower().endswith(('.wav', '.mp3')):
+                    shutil.copy2(path, os.path.join(new_dir, f))
+            old_dir = tempfile.mkdtemp(prefix=f'.{os.path.basename(voice_dir)}-old-', dir=base_dir)
+            os.replace(voice_dir, old_dir)
+            try:
+                os.replace(new_dir, voice_dir)
+            except OSError:
+                os.replace(old_dir, voice_dir)
+                raise
+            shutil.rmtree(old_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(new_dir, ignore_errors=True)
+            raise
+
+    # Estado atual da voz (None se ela não foi enviada neste processo)
+    def status(self, voice_name):
+        with self._lock:
+            status = dict(self._status[voice_name]) if voice_name in self._status else None
+        if status is None or status['status'] != UPLOAD_PREPARING:
+            return status
+        job = get_job(status['job_id'], self.db_path)
+        if job is not None and job['status'] == STATUS_DONE:
+            self._set(voice_name, status=UPLOAD_READY)
+            status['status'] = UPLOAD_READY
+        elif job is not None and job['status'] == STATUS_FAILED:
+            self._set(voice_name, status=UPLOAD_FAILED, message=job['error'])
+            status.update(status=UPLOAD_FAILED, message=job['error'])
+        return status
+
+    # Alguma voz ainda em processamento? (a UI continua atualizando enquanto houver). Vozes sem
+    # mudança de estado há mais de max_age segundos não contam, e sem worker pronto
+    # (workers_ready=False) os latentes não andam, então vozes esperando por eles também não.
+    def pending(self, max_age=None, workers_ready=True):
+        with self._lock:
+            names = list(self._status)
+        now = time.time()
+        for name in names:
+            status = self.status(name)
+            if max_age is not None and now - status['updated_at'] > max_age:
+                continue
+            if status['status'] == UPLOAD_PROCESSING or (status['status'] == UPLOAD_PREPARING and workers_ready):
+                return True
+        return False